@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from typing import Dict, Any, List, Optional
+from prometheus_client import Counter, Histogram
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from config import settings
+from db import stream_rows
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+QUERY_ADMISSIONS = Counter("capstone_query_admissions_total", "Queries seen by the admission gate", ["lane", "outcome"])
+QUERY_ESTIMATED_COST = Histogram(
+    "capstone_query_estimated_cost", "Planner cost estimate of generated queries",
+    buckets=(10, 100, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+)
+QUERY_LANE_WAIT_SECONDS = Histogram(
+    "capstone_query_lane_wait_seconds", "Time a query waited for a lane slot", ["lane"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# SQLSTATE query_canceled, raised when statement_timeout fires
+QUERY_CANCELED = "57014"
+
+class QueryRejected(Exception):
+    """The query was not run (over budget, lane busy) or was cancelled by its timeout."""
+    def __init__(self, message: str, reason: str = "cost"):
+        super().__init__(message)
+        # "cost", "busy" or "timeout"
+        self.reason = reason
+
+# -------------------------
+# EXPLAIN based admission control in front of every generated query
+# -------------------------
+
+def explain_estimate(db, query: str, params: dict = None) -> Dict[str, float]:
+    plan = db.execute(text("EXPLAIN (FORMAT JSON) " + query), params or {}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    top = plan[0]["Plan"]
+    return {"cost": float(top["Total Cost"]), "rows": float(top["Plan Rows"])}
+
+class QueryGate:
+    """
+    Estimates a query with EXPLAIN before running it:
+    - estimated cost over max_cost: rejected without running
+    - cost over fast_cost or rows over fast_rows: waits for one of the few slow-lane slots
+    - anything else takes the fast lane
+    Every lane runs its queries under its own statement_timeout.
+    """
+    def __init__(self, fast_concurrency: int, slow_concurrency: int, fast_cost: float, fast_rows: float,
+                 max_cost: float, fast_timeout_ms: int, slow_timeout_ms: int, queue_timeout: float, enabled: bool = True):
+        self.fast_cost = fast_cost
+        self.fast_rows = fast_rows
+        self.max_cost = max_cost
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.lanes = {
+            "fast": (threading.BoundedSemaphore(fast_concurrency), fast_timeout_ms),
+            "slow": (threading.BoundedSemaphore(slow_concurrency), slow_timeout_ms),
+        }
+
+    def classify(self, estimate: Dict[str, float]) -> str:
+        if estimate["cost"] > self.max_cost:
+            return "rejected"
+        if estimate["cost"] > self.fast_cost or estimate["rows"] > self.fast_rows:
+            return "slow"
+        return "fast"
+
+    def run(self, db, query: str, params: dict = None, fetch_size: int = 1000, max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+        if not self.enabled or db.get_bind().dialect.name != "postgresql":
+            return stream_rows(db, query, params, fetch_size=fetch_size, max_rows=max_rows)
+
+        estimate = explain_estimate(db, query, params)
+        QUERY_ESTIMATED_COST.observe(estimate["cost"])
+        lane = self.classify(estimate)
+        logger.debug("Query estimate %s -> %s lane", estimate, lane)
+        if lane == "rejected":
+            QUERY_ADMISSIONS.labels(lane="none", outcome="rejected").inc()
+            raise QueryRejected(
+                f"The query is too expensive to run (estimated cost {estimate['cost']:.0f}, budget {self.max_cost:.0f}). "
+                "Try narrowing it with filters or a coarser grouping."
+            )
+
+        slots, timeout_ms = self.lanes[lane]
+        start = time.monotonic()
+        if not slots.acquire(timeout=self.queue_timeout):
+            QUERY_ADMISSIONS.labels(lane=lane, outcome="queue_timeout").inc()
+            raise QueryRejected("The database is busy with other heavy queries, please try again shortly.", reason="busy")
+        QUERY_LANE_WAIT_SECONDS.labels(lane=lane).observe(time.monotonic() - start)
+        try:
+            # SET LOCAL only lasts for the current transaction
+            db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+            rows = stream_rows(db, query, params, fetch_size=fetch_size, max_rows=max_rows)
+        except DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) != QUERY_CANCELED:
+                QUERY_ADMISSIONS.labels(lane=lane, outcome="error").inc()
+                raise
+            db.rollback()
+            QUERY_ADMISSIONS.labels(lane=lane, outcome="timeout").inc()
+            raise QueryRejected(f"The query took longer than {timeout_ms / 1000:.0f}s and was cancelled.", reason="timeout")
+        finally:
+            slots.release()
+        QUERY_ADMISSIONS.labels(lane=lane, outcome="admitted").inc()
+        return rows
+
+gate = QueryGate(
+    fast_concurrency=settings.QUERY_FAST_LANE_CONCURRENCY,
+    slow_concurrency=settings.QUERY_SLOW_LANE_CONCURRENCY,
+    fast_cost=settings.QUERY_FAST_MAX_COST,
+    fast_rows=settings.QUERY_FAST_MAX_ROWS,
+    max_cost=settings.QUERY_MAX_COST,
+    fast_timeout_ms=settings.QUERY_FAST_TIMEOUT_MS,
+    slow_timeout_ms=settings.QUERY_SLOW_TIMEOUT_MS,
+    queue_timeout=settings.QUERY_QUEUE_TIMEOUT_SECONDS,
+    enabled=settings.QUERY_ADMISSION_ENABLED,
+)
@@ -1,4 +1,3 @@
-from langchain_openai import ChatOpenAI
 from config import settings
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
@@ -7,16 +6,59 @@ from typing import Tuple,Optional,List,Union,Dict
 from model import DatabaseMetadata
 import json
 from enum import Enum
-from agents import function_tool
-from agents import Agent,Runner,SQLiteSession
-from braintrust import init_logger, load_prompt
-from braintrust.wrappers.openai import BraintrustTracingProcessor
 from db import get_db_session
+from admission import gate,QueryRejected
 from sqlalchemy import text
 from sqlalchemy.orm import session
 from fastapi.encoders import jsonable_encoder
-
-llm = ChatOpenAI(model = "gpt-5.1",api_key=settings.OPENAI_API_KEY,temperature=0)
+from dataset_store import encode_values,decode_expression
+from concurrent.futures import ThreadPoolExecutor
+from shared_scan import batcher,aggregate_sql
+from result_store import register_result,summarize_rows
+from langchain_core.callbacks import BaseCallbackHandler
+from metrics import stage,record_tokens,record_rows,record_cache
+from app_logging import get_logger,log_payload
+import threading
+from llm_gateway import gateway
+from prompt_layout import dataset_prefix
+from fast_planner import plan_question
+from local_summary import summarize_locally
+from approximate import sample_percent,is_approximable,build_sample_sql,scale_sample_rows
+
+logger = get_logger(__name__)
+
+llm = None
+_llm_lock = threading.Lock()
+
+#Build the chat client on first use instead of at import
+def get_llm():
+    global llm
+    if llm is None:
+        with _llm_lock:
+            if llm is None:
+                from langchain_openai import ChatOpenAI
+                if not settings.OPENAI_API_KEY:
+                    raise Exception("OPENAI_API_KEY is not configured")
+                # retries and timeouts are handled by llm_gateway
+                llm = ChatOpenAI(
+                    model = "gpt-5.1",api_key=settings.OPENAI_API_KEY,temperature=0,
+                    max_retries=0,timeout=max(settings.LLM_TIMEOUT_SECONDS.values())
+                )
+    return llm
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Feeds the token usage of every LLM call into the stage metrics."""
+    def __init__(self,stage_name:str):
+        self.stage_name = stage_name
+
+    def on_llm_end(self,response,**kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation,"message",None)
+                usage = getattr(message,"usage_metadata",None)
+                record_tokens(self.stage_name,usage)
+                if usage:
+                    logger.debug("%s tokens : %s",self.stage_name,usage)
 
 class SQLOperator(str, Enum):
     eq = "="
@@ -108,101 +150,131 @@ class SQL_Validator(BaseModel):
     violations: Optional[List[c_violations]] = None
     suggested_fix: str | None
 
-def run_sql(query:str,db:session = get_db_session()):
-    try:
-        data = []
-        for row in db.execute(text(query)).mappings():
-            data.append(row)
-        return data
-    except Exception as e:
-        print("Failed to run query ",e)
-        raise Exception("Failed to run query ",e)
-    finally:
-        if db:
-            db.close()
-            print("Session is closed .")
-
-def sql_builder ( db_result,table_name,data:dict):
-    try:
-        print("Input Data:",data)
-        column_mapping = db_result["column_mapping"]
-        columns = {item["name"] for item in db_result["columns"]}
-
-        select_part = ""
-        where_part = "WHERE 1=1"
-        group_by_part = ""
-        order_by_part = ""
-        limit = None
-
-        if data["metrics"]:
-            select_part = ""
-            for i in data["metrics"]:
-                for key in i.keys():
-                    if select_part:
-                        print("Im in SQL script")
-                        select_part += f" , {key.value}("
-                    else:
-                        select_part += f"{key.value}("
-                    
-                    if i[key] in column_mapping.keys():
-                        select_part += f"{column_mapping[i[key]]})"
-                    else:
-                        select_part += f"{i[key]})"
-        
-        if data["filters"]:
-            filters = data["filters"]
-            for filter in filters:
-                if filters[filter] and filter != 'date':
-                    value = column_mapping[filter]
+# rule-based plans only reference catalog columns and are compiled by sql_builder
+RULES_VERDICT = SQL_Validator(verdict="correct",reason="Compiled from a rule-based plan",suggested_fix=None)
+
+# group / order words served by the materialized time buckets, quarter keeps its year
+TIME_BUCKET_GROUPS = {"year":["year"],"quarter":["year","quarter"],"month":["month"]}
+
+def sql_parts(db_result,data:dict):
+    """
+    Break an Answer plan into the pieces of a single-table aggregate query.
+    metrics: [(function, expression)], where: [predicate], group_by: [(column, select expression)],
+    order_by: [(function or None, column, direction)], limit.
+    """
+    column_mapping = db_result["column_mapping"]
+    columns = {item["name"] for item in db_result["columns"]}
+    dictionaries = db_result.get("dictionaries") or {}
+    time_buckets = db_result.get("time_buckets") or {}
+    parts = {"metrics":[],"where":[],"group_by":[],"order_by":[],"limit":None}
+
+    if data["metrics"]:
+        for i in data["metrics"]:
+            for key in i.keys():
+                column_name = column_mapping[i[key]] if i[key] in column_mapping.keys() else i[key]
+                # MIN/MAX over a dictionary column must compare the real values
+                if column_name in dictionaries and key.value in ("MIN","MAX"):
+                    column_name = decode_expression(column_name,dictionaries[column_name])
+                parts["metrics"].append((key.value,column_name))
+    
+    if data["filters"]:
+        filters = data["filters"]
+        for filter in filters:
+            if filters[filter] and filter != 'date':
+                value = column_mapping[filter]
+                if value in dictionaries:
+                    values = ", ".join(str(code) for code in encode_values(dictionaries[value],filters[filter]))
+                else:
                     values = ", ".join(f"'{str(item)}'" for item in filters[filter])
-                    where_part += f" AND {value} IN ({values})"
-                
-                if filters[filter] and filter == 'date':
-                    value = column_mapping[filter]
-                    values = " AND ".join(f"'{str(item)}'" for item in filters[filter])
-                    where_part += f" AND {value} Between {values}"
-                                
-        if data["extra_filter"]:
-            for item in data["extra_filter"]:
-                if item["column"] in columns:
-                    if item["op"] in ("IS NULL", "IS NOT NULL"):
-                        where_part += f" AND {item["column"]} {item["op"].value}"
-                    elif item["op"] in ("BETWEEN", "NOT BETWEEN"):
-                        where_part += f" AND {item["column"]} {item["op"].value} '{item["value"][0]}' AND '{item["value"][1]}'"
-                    elif item["op"] in ("IN", "NOT IN"):
+                parts["where"].append(f"{value} IN ({values})")
+            
+            if filters[filter] and filter == 'date':
+                value = column_mapping[filter]
+                values = " AND ".join(f"'{str(item)}'" for item in filters[filter])
+                parts["where"].append(f"{value} Between {values}")
+                            
+    if data["extra_filter"]:
+        for item in data["extra_filter"]:
+            if item["column"] in columns:
+                column = item["column"]
+                op = item["op"].value
+                dictionary = dictionaries.get(column)
+                if op in ("IS NULL", "IS NOT NULL"):
+                    parts["where"].append(f"{column} {op}")
+                elif dictionary and op in ("IN", "NOT IN"):
+                    values = ", ".join(str(code) for code in encode_values(dictionary,item["value"]))
+                    parts["where"].append(f"{column} {op} ({values})")
+                elif dictionary and op in ("=", "!=", "<>"):
+                    parts["where"].append(f"{column} {op} {encode_values(dictionary,[item['value']])[0]}")
+                else:
+                    if dictionary:
+                        # range / pattern predicates are evaluated on the decoded value
+                        column = decode_expression(column,dictionary)
+                    if op in ("BETWEEN", "NOT BETWEEN"):
+                        parts["where"].append(f"{column} {op} '{item['value'][0]}' AND '{item['value'][1]}'")
+                    elif op in ("IN", "NOT IN"):
                         values = ", ".join(f"'{v}'" for v in item["value"])
-                        where_part += f" AND {item["column"]} {item["op"].value} ({values})"                        
+                        parts["where"].append(f"{column} {op} ({values})")
                     else:
-                        where_part += f" AND {item["column"]} {item["op"].value} '{item["value"]}'"
-        
-        if data["group_by"]:
-            for i in data["group_by"]:
-                value = i
-                if i in column_mapping.keys():
-                    value = column_mapping[i]
-                if group_by_part:
-                     group_by_part += f", {value}"
-                else:
-                     group_by_part += value
-
-        if data["order_by"]:
-            for item in data["order_by"]:
-                column_name = column_mapping[item["column_name"]] if item["column_name"] in column_mapping.keys() else item["column_name"]
-                if item["funtion"]:
-                    function_name = f"{item["funtion"].value}("if item["funtion"] else ""
-                    column_name = function_name + column_name + ")"
-                
-                ob = item["order_by"].value
-                if order_by_part:
-                    order_by_part += f", {column_name} {ob}"
-                else:
-                    order_by_part += f"{column_name} {ob}"
+                        parts["where"].append(f"{column} {op} '{item['value']}'")
+    
+    if data["group_by"]:
+        for i in data["group_by"]:
+            if i in TIME_BUCKET_GROUPS and time_buckets:
+                for bucket in TIME_BUCKET_GROUPS[i]:
+                    if time_buckets[bucket] not in [column for column,_ in parts["group_by"]]:
+                        parts["group_by"].append((time_buckets[bucket],time_buckets[bucket]))
+                continue
+            value = i
+            if i in column_mapping.keys():
+                value = column_mapping[i]
+            # group on the smallint code, return the decoded value
+            select_value = value
+            if value in dictionaries:
+                select_value = f"{decode_expression(value,dictionaries[value])} AS {value}"
+            parts["group_by"].append((value,select_value))
+
+    if data["order_by"]:
+        group_columns = [column for column,_ in parts["group_by"]]
+        for item in data["order_by"]:
+            column_name = column_mapping[item["column_name"]] if item["column_name"] in column_mapping.keys() else item["column_name"]
+            function_name = item["funtion"].value if item["funtion"] else None
+            if function_name is None and item["column_name"] in TIME_BUCKET_GROUPS and time_buckets:
+                for bucket in TIME_BUCKET_GROUPS[item["column_name"]]:
+                    parts["order_by"].append((None,time_buckets[bucket],item["order_by"].value))
+                continue
+            # appended values get codes out of order, so dictionary columns sort on the decoded value:
+            # a grouped one through its decoded output column of the same name, anything else explicitly
+            if column_name in dictionaries:
+                if function_name in ("MIN","MAX") or (function_name is None and column_name not in group_columns):
+                    column_name = decode_expression(column_name,dictionaries[column_name])
+            parts["order_by"].append((function_name,column_name,item["order_by"].value))
+
+    if not parts["order_by"]:
+        # a time series comes back in time order
+        bucket_columns = set(time_buckets.values())
+        parts["order_by"] = [(None,column,"ASC") for column,_ in parts["group_by"] if column in bucket_columns]
+
+    if data["limit"]:
+        parts["limit"] = data["limit"]
+    return parts
 
-        if data["limit"]:
-            limit = data["limit"]  
-        print(select_part)
+def sql_builder ( db_result,table_name,data:dict):
+    try:
+        log_payload(logger,"Input Data: %s",data)
+        parts = sql_parts(db_result,data)
+
+        select_part = " , ".join(aggregate_sql(func,column) for func,column in parts["metrics"])
+        where_part = "WHERE 1=1" + "".join(f" AND {predicate}" for predicate in parts["where"])
+        group_by_part = ", ".join(column for column,_ in parts["group_by"])
+        group_select_part = ", ".join(select_value for _,select_value in parts["group_by"])
+        order_by_part = ", ".join(
+            f"{aggregate_sql(func,column)} {ob}" if func else f"{column} {ob}"
+            for func,column,ob in parts["order_by"]
+        )
+        limit = parts["limit"]
         if group_by_part:
-            select_part = group_by_part + "," + select_part
+            select_part = group_select_part + "," + select_part
         
         final_sql = f"""select {select_part} from {table_name}
         {f"{where_part}" if where_part else ''}
@@ -212,19 +284,51 @@ def sql_builder ( db_result,table_name,data:dict):
         """
 
         final_sql.replace('None','null')
-        print("\n\nSQL Builder : ",final_sql,"\n\n")
+        log_payload(logger,"SQL Builder : %s",final_sql)
         return final_sql
     except Exception as e:
-        print(e)
+        logger.exception("Failed to generate the SQL")
         raise Exception("Failed to generate the SQL",e)
 
-def query_generator(table_name,user_query,db:session = get_db_session()):
+def planner_context(table_metadata):
+    return {"DATASET_CONTEXT": dataset_prefix(table_metadata)}
+
+def column_type_catalog(table_metadata):
+    column_type_mapping = []
+    for i in table_metadata["columns"]:
+        if i.get("encoding") == "dictionary":
+            # stored as smallint codes, decoded through an ARRAY[...] lookup
+            column_type_mapping.append({"column_name":i["name"],"type":"smallint (dictionary code)"})
+        else:
+            # the physical type, so nobody adds ::numeric casts to typed columns
+            column_type_mapping.append({"column_name":i["name"],"type":i.get("storage") or i["type"]})
+    # generated by Postgres from the date role, used for year / quarter / month grouping
+    for bucket,column in (table_metadata.get("time_buckets") or {}).items():
+        column_type_mapping.append({"column_name":column,"type":"date (first day of month)" if bucket == "month" else f"smallint ({bucket})"})
+    return column_type_mapping
+
+def query_generator(table_name,user_query,db:session = get_db_session(),table_metadata = None,context = None):
     try:
-        data = db.query(DatabaseMetadata).filter(DatabaseMetadata.table_name == table_name).first()
+        if table_metadata is None:
+            data = db.query(DatabaseMetadata).filter(DatabaseMetadata.table_name == table_name).first()
+            table_metadata = data.table_metadata
 
-        if data.table_metadata["status"] != "ready":
+        if table_metadata["status"] != "ready":
             return {"message":"Data processing still in progress please wait for sometime..!"}
-        
+
+        # common question templates are planned locally, only the unclear ones reach the LLM
+        if settings.FAST_PLANNER_ENABLED:
+            with stage("fast_planner"):
+                plan,confidence = plan_question(user_query,table_metadata)
+            fast_path = plan is not None and confidence >= settings.FAST_PLANNER_MIN_CONFIDENCE
+            record_cache("fast_planner",hit=fast_path)
+            if fast_path:
+                logger.debug("Fast planner (%.2f) : %s",confidence,user_query)
+                answer = ResultData.model_validate({"answer":plan}).model_dump()
+                output_query = sql_builder(data=answer['answer'],db_result = table_metadata,table_name=table_name)
+                parts = sql_parts(data=answer['answer'],db_result = table_metadata)
+                return { "llm_response":answer,"sql_query":output_query,"sql_parts":parts,"planner":"rules","confidence":confidence}
+
         SYSTEM_PROMPT = """You are a data analytics query planner for a merchandising sales dataset.
         Your job: convert the user's natural-language question into a JSON query plan that can be executed deterministically with SQL.
 
@@ -248,11 +352,11 @@ def query_generator(table_name,user_query,db:session = get_db_session()):
         - If the user specifies a date range, use it directly (YYYY-MM-DD)
         - If time is missing, set date_range to null and add a note.
         8) Metrics allowed: revenue, units_sold, avg_selling_price or column from column_catalog alone.
-        9) Group_by allowed: region, item_type, channel, date, quarter (only if date role exists) or column from column_catalog alone.
+        9) Group_by allowed: region, item_type, channel, date, year, quarter, month (only if date role exists) or column from column_catalog alone.
         10) Order by allowed:
-            a) region, item_type, channel, date, quarter (only if date role exists) or 
+            a) region, item_type, channel, date, year, quarter, month (only if date role exists) or 
             b) column from column_catalog alone or 
-            c) Aggregate function with region, item_type, channel, date, quarter (only if date role exists) or column from column_catalog alone.
+            c) Aggregate function with region, item_type, channel, date, year, quarter, month (only if date role exists) or column from column_catalog alone.
             order by format (if applicable Aggregate function name,column_name,Ascending (asc) / Descending(desc))
         11) Limit should only contain numeric value.
         12) All date fields or entity in response must be in format like date_range [YYYY-01-01, YYYY-12-31] 
@@ -260,65 +364,48 @@ def query_generator(table_name,user_query,db:session = get_db_session()):
         Your output MUST be valid JSON that conforms exactly to the provided schema.
         Do not include any text outside the JSON.
         """
-        result = data.table_metadata
+        result = table_metadata
         USER_QUESTION = user_query
-        COLUMN_MAPPING_JSON = json.dumps(result['column_mapping'])
-        REGIONS_LIST = json.dumps(result['distinct_values']['regions'])
-        ITEM_TYPES_LIST =  json.dumps(result['distinct_values']['item_types'])
-        CHANNELS_LIST = json.dumps(result['distinct_values']['channels'])
-        COLUMN_CATALOG = json.dumps(result['columns'])
-        USER_PROMPT = """
-        -- Details --
-        {{
-        "question": "{USER_QUESTION}",
-        "supported_roles": ["region","item_type","channel","date","units_sold","revenue","avg_selling_price"],
-        "column_mapping": {COLUMN_MAPPING_JSON},
-        "column_catalog": {COLUMN_CATALOG}
-        "allowed_values": {{
-            "regions": {REGIONS_LIST},
-            "item_types": {ITEM_TYPES_LIST},
-            "channels": {CHANNELS_LIST}
-        }},
-        "defaults": {{
-            "metrics_if_unspecified": ["revenue","units_sold","avg_selling_price"]
-        }}
-        }}
-
-        {format_instruction}
+        if context is None:
+            context = planner_context(result)
+        # static rules + schema first, then the per-dataset catalog, the question last
+        QUESTION_PROMPT = """-- Question --
+        {USER_QUESTION}
         """
 
-        analysis_parser = PydanticOutputParser(pydantic_object=ResultData)
-        message = (
-        ChatPromptTemplate.from_messages(
-                [
-                    ("system",SYSTEM_PROMPT),
-                    ("human",USER_PROMPT)
-                ]
-            ).partial(format_instruction = analysis_parser.get_format_instructions())
-        )
-
-        chain = message | llm | analysis_parser
-
-        llm_response: ResultData = chain.invoke({
-            "USER_QUESTION":USER_QUESTION,
-            "COLUMN_MAPPING_JSON": COLUMN_MAPPING_JSON,
-            "COLUMN_CATALOG": COLUMN_CATALOG,
-            "REGIONS_LIST": REGIONS_LIST,
-            "ITEM_TYPES_LIST": ITEM_TYPES_LIST,
-            "CHANNELS_LIST": CHANNELS_LIST
-        })
-
-        print(llm_response)
+        def build(llm):
+            analysis_parser = PydanticOutputParser(pydantic_object=ResultData)
+            message = (
+            ChatPromptTemplate.from_messages(
+                    [
+                        ("system",SYSTEM_PROMPT + "\n{format_instruction}"),
+                        ("human","{DATASET_CONTEXT}"),
+                        ("human",QUESTION_PROMPT)
+                    ]
+                ).partial(format_instruction = analysis_parser.get_format_instructions())
+            )
+            return message | llm | analysis_parser
+
+        chain = gateway.chain("planner",get_llm(),build)
+
+        with stage("planner_llm"):
+            llm_response: ResultData = gateway.invoke("planner_llm",chain,{
+                "USER_QUESTION":USER_QUESTION,
+                **context
+            },config={"callbacks":[TokenUsageCallback("planner_llm")]})
+
+        log_payload(logger,"Planner response : %s",llm_response)
 
         output_query = sql_builder(data=llm_response.model_dump()['answer'],db_result = result,table_name=table_name)
-        return { "llm_response":llm_response.model_dump(),"sql_query":output_query}
+        parts = sql_parts(data=llm_response.model_dump()['answer'],db_result = result)
+        return { "llm_response":llm_response.model_dump(),"sql_query":output_query,"sql_parts":parts,"planner":"llm"}
     except Exception as e:
-        print("Failed while generating query : ",e)
+        logger.exception("Failed while generating query")
         raise Exception("Failed while generating query : ",e)
     finally:
         if db:
             db.close()
-            print("Session is closed.")
+            logger.debug("Session is closed")
 
 def query_validator(TABLE_NAME,COLUMN_CATALOG_JSON,SQL_QUERY):
     try:
@@ -354,44 +441,47 @@ def query_validator(TABLE_NAME,COLUMN_CATALOG_JSON,SQL_QUERY):
         - suggested_fix: provide a corrected SELECT query only IF you can fix it without inventing columns/tables and while preserving placeholders. Otherwise set suggested_fix to null.
         """
 
-        USER_PROMPT = """Validate the following SQL against the rules.
-
-        table_name: {TABLE_NAME}
+        DATASET_PROMPT = """table_name: {TABLE_NAME}
 
         column_catalog (allowed columns):
         {COLUMN_CATALOG_JSON}
+        """
+
+        USER_PROMPT = """Validate the following SQL against the rules.
 
         SQL to validate:
         {SQL_QUERY}
-
-        {format_instruction}
         """
 
-        analysis_parser = PydanticOutputParser(pydantic_object=SQL_Validator)
-        message = (
-            ChatPromptTemplate.from_messages([
-                ("system",SYSTEM_PROMPT),
-                ("user",USER_PROMPT)
-            ]).partial(format_instruction = analysis_parser.get_format_instructions())
-        )
-
-        chain = message | llm | analysis_parser
-
-        verdict_response: SQL_Validator = chain.invoke({
-            "TABLE_NAME":TABLE_NAME,
-            "COLUMN_CATALOG_JSON": COLUMN_CATALOG_JSON,
-            "SQL_QUERY": SQL_QUERY
-        })
-
-        print(verdict_response.model_dump_json())
+        def build(llm):
+            analysis_parser = PydanticOutputParser(pydantic_object=SQL_Validator)
+            message = (
+                ChatPromptTemplate.from_messages([
+                    ("system",SYSTEM_PROMPT + "\n{format_instruction}"),
+                    ("user",DATASET_PROMPT),
+                    ("user",USER_PROMPT)
+                ]).partial(format_instruction = analysis_parser.get_format_instructions())
+            )
+            return message | llm | analysis_parser
+
+        chain = gateway.chain("validator",get_llm(),build)
+
+        with stage("validator_llm"):
+            verdict_response: SQL_Validator = gateway.invoke("validator_llm",chain,{
+                "TABLE_NAME":TABLE_NAME,
+                "COLUMN_CATALOG_JSON": COLUMN_CATALOG_JSON,
+                "SQL_QUERY": SQL_QUERY
+            },config={"callbacks":[TokenUsageCallback("validator_llm")]})
+
+        log_payload(logger,"Validator response : %s",verdict_response)
         return verdict_response
     except Exception as e:
-        print("Failed to valiate ",e)
+        logger.exception("Failed to validate")
         raise Exception("Failed to valiate ",e)
 
-def result_generator(query_generator_result,USER_QUESTION,QUERY_RESULT_ROWS):
+def result_generator(query_generator_result,USER_QUESTION,QUERY_RESULT_ROWS,RESULT_SUMMARY = None):
     try:
-        print("Generating the result ..")
+        logger.debug("Generating the result")
         SYSTEM_PROMPT = """You are an analytics result explanation assistant.
         Your task:
         - Explain the results of a data query to a business user.
@@ -402,7 +492,8 @@ def result_generator(query_generator_result,USER_QUESTION,QUERY_RESULT_ROWS):
 
         Rules:
         1) Use the user's original question as context for your explanation.
-        2) Base all statements strictly on the provided query result rows.
+        2) Base all statements strictly on the provided query result rows and result summary.
+           The rows may only be a preview, use the summary for totals and counts.
         3) If the result is empty, clearly say that no matching data was found.
         4) Clearly state which filters were applied.
         5) If notes are provided (e.g., missing fields, ignored filters), surface them politely.
@@ -436,68 +527,253 @@ def result_generator(query_generator_result,USER_QUESTION,QUERY_RESULT_ROWS):
         Group By:
         {GROUP_BY_LIST}
 
-        Query Result Rows:
+        Query Result Rows (preview):
         {QUERY_RESULT_ROWS}
 
+        Result Summary (computed over all returned rows):
+        {RESULT_SUMMARY}
+
         Notes:
         {NOTES_LIST}
         """
 
-        message = (
-            ChatPromptTemplate([
-                ("system",SYSTEM_PROMPT),
-                ("human",USER_PROMPT)
-            ])
-        )
-
-        chain = message | llm
-
-        result = chain.invoke({
-            "USER_QUESTION":USER_QUESTION,
-            "REGION_FILTER":json.dumps(query_generator_result["filters"]["region"]),
-            "ITEM_TYPE_FILTER":json.dumps(query_generator_result["filters"]["item_type"]),
-            "CHANNEL_FILTER":json.dumps(query_generator_result["filters"]["channel"]),
-            "DATE_RANGE":json.dumps(query_generator_result["filters"]["date"]),
-            "EXTRA_FILTERS_SUMMARY":json.dumps(query_generator_result["extra_filter"]),
-            "METRICS_LIST":json.dumps(query_generator_result["metrics"]),
-            "GROUP_BY_LIST": json.dumps(query_generator_result["group_by"]),
-            "NOTES_LIST": json.dumps(query_generator_result["notes"]),
-            "QUERY_RESULT_ROWS": QUERY_RESULT_ROWS
-        })
-
-        print(result.model_dump_json())
+        def build(llm):
+            message = (
+                ChatPromptTemplate([
+                    ("system",SYSTEM_PROMPT),
+                    ("human",USER_PROMPT)
+                ])
+            )
+            return message | llm
+
+        chain = gateway.chain("summarizer",get_llm(),build)
+
+        with stage("summarizer_llm"):
+            result = gateway.invoke("summarizer_llm",chain,{
+                "USER_QUESTION":USER_QUESTION,
+                "REGION_FILTER":json.dumps(query_generator_result["filters"]["region"]),
+                "ITEM_TYPE_FILTER":json.dumps(query_generator_result["filters"]["item_type"]),
+                "CHANNEL_FILTER":json.dumps(query_generator_result["filters"]["channel"]),
+                "DATE_RANGE":json.dumps(query_generator_result["filters"]["date"]),
+                "EXTRA_FILTERS_SUMMARY":json.dumps(query_generator_result["extra_filter"]),
+                "METRICS_LIST":json.dumps(query_generator_result["metrics"]),
+                "GROUP_BY_LIST": json.dumps(query_generator_result["group_by"]),
+                "NOTES_LIST": json.dumps(query_generator_result["notes"]),
+                "QUERY_RESULT_ROWS": QUERY_RESULT_ROWS,
+                "RESULT_SUMMARY": json.dumps(RESULT_SUMMARY)
+            },config={"callbacks":[TokenUsageCallback("summarizer_llm")]})
+
+        log_payload(logger,"Summarizer response : %s",result)
         return json.loads(result.model_dump_json())
     except Exception as e:
-        print("Failed to generate the final answer ..!",e)
+        logger.exception("Failed to generate the final answer")
         raise Exception("Failed to generate the final answer ..!",e)
 
-def orchestrator(table_name,user_query,db:session = get_db_session()):
+def summarize_result(generated_json,user_query,rows,truncated = False,detailed = False,approximate = None):
+    """
+    Template narrative for small results, the LLM summarizer above the
+    complexity threshold or when a detailed answer is asked for.
+    `approximate` ({"sample_percent","confidence"}) marks rows estimated from a sample.
+    """
+    answer = generated_json["llm_response"]["answer"]
+    if settings.LOCAL_SUMMARY_ENABLED and not detailed:
+        with stage("local_summary"):
+            message = summarize_locally(
+                answer,rows,[column for column,_ in generated_json["sql_parts"]["group_by"]],truncated,
+                max_rows=settings.LOCAL_SUMMARY_MAX_ROWS,max_metrics=settings.LOCAL_SUMMARY_MAX_METRICS,
+                approximate=approximate
+            )
+        record_cache("local_summary",hit=message is not None)
+        if message is not None:
+            return message
+    if approximate:
+        answer = {**answer,"notes":list(answer.get("notes") or []) + [
+            f"Values are estimated from a {approximate['sample_percent']:g}% random sample of the data. "
+            f"Each *_margin value is the {approximate['confidence']:.0%} confidence margin (plus or minus) of its estimate."
+        ]}
+    llm_nlp = result_generator(
+        query_generator_result = answer,
+        USER_QUESTION = user_query,
+        QUERY_RESULT_ROWS = jsonable_encoder(rows[:settings.SUMMARY_PREVIEW_ROWS]),
+        RESULT_SUMMARY = summarize_rows(rows,truncated)
+    )
+    return llm_nlp["content"]
+
+#Run a plan over a table sample, None when sampling does not apply and the exact query should run
+def run_approximate(table_name,parts,table_metadata):
+    percent = sample_percent(
+        (table_metadata.get("stats") or {}).get("row_count") or 0,
+        settings.APPROX_TARGET_ROWS,settings.APPROX_MIN_ROWS
+    )
+    if percent is None or not is_approximable(parts):
+        return None
+    sql_query = build_sample_sql(table_name,parts,percent,settings.APPROX_SAMPLE_METHOD)
+    log_payload(logger,"Sample SQL : %s",sql_query)
+    db = get_db_session()
+    try:
+        rows = gate.run(db,sql_query,fetch_size=settings.SQL_FETCH_SIZE,max_rows=settings.SQL_MAX_ROWS + 1)
+    finally:
+        db.close()
+    return {
+        "rows":scale_sample_rows(rows,parts,percent,settings.APPROX_CONFIDENCE),
+        "sample_percent":percent,
+        "method":settings.APPROX_SAMPLE_METHOD,
+        "confidence":settings.APPROX_CONFIDENCE
+    }
+
+def orchestrator(table_name,user_query,db:session = get_db_session(),detailed = False,approximate = False):
     try:
-        print(table_name,user_query)
+        logger.info("Analyse %s : %s",table_name,user_query)
         generated_json = query_generator(table_name=table_name,user_query=user_query) 
         
         result = db.query(DatabaseMetadata.table_metadata).filter(DatabaseMetadata.table_name == table_name).first()
         column_type_mapping = []
         for table_metadata in result:
-            for i in table_metadata["columns"]:
-                column_type_mapping.append({"column_name":i["name"],"type":i["type"]})
+            column_type_mapping.extend(column_type_catalog(table_metadata))
 
-        sql_validation = query_validator(TABLE_NAME=table_name,COLUMN_CATALOG_JSON=json.dumps(column_type_mapping),SQL_QUERY=generated_json["sql_query"])
+        if generated_json.get("planner") == "rules":
+            sql_validation = RULES_VERDICT
+        else:
+            sql_validation = query_validator(TABLE_NAME=table_name,COLUMN_CATALOG_JSON=json.dumps(column_type_mapping),SQL_QUERY=generated_json["sql_query"])
 
         verdict = sql_validation.verdict.lower()
         llm_nlp = None
         if verdict == "correct":
-            final_result = run_sql(generated_json["sql_query"])
-            final_result = [dict(row) for row in final_result]
-            print("Result Generation Started ..")
-            llm_nlp = result_generator(query_generator_result = generated_json["llm_response"]["answer"],USER_QUESTION = user_query,QUERY_RESULT_ROWS = jsonable_encoder(final_result))
-            return llm_nlp["content"]
+            sample = None
+            if approximate:
+                with stage("sql_execution"):
+                    sample = run_approximate(table_name,generated_json["sql_parts"],result[0])
+            if sample is not None:
+                final_result = sample["rows"]
+            else:
+                # aggregate plans arriving together on this table share one scan
+                with stage("sql_execution"):
+                    final_result = batcher.submit(table_name,generated_json["sql_parts"],generated_json["sql_query"],max_rows=settings.SQL_MAX_ROWS + 1)
+            record_rows("sql_execution","returned",len(final_result))
+            truncated = len(final_result) > settings.SQL_MAX_ROWS
+            final_result = final_result[:settings.SQL_MAX_ROWS]
+            # raw result pages always come from the exact query
+            result_id = register_result(table_name,generated_json["sql_query"],[column for column,_ in generated_json["sql_parts"]["group_by"]])
+            logger.debug("Result generation started")
+            approx_info = {k:v for k,v in sample.items() if k != "rows"} if sample else None
+            message = summarize_result(generated_json,user_query,final_result,truncated,detailed,approx_info)
+            response = {"message":message,"result_id":result_id,"row_count":len(final_result),"truncated":truncated}
+            if approximate:
+                # null when the table was too small or the metrics cannot be scaled, the answer is exact then
+                response["approximate"] = None if sample is None else jsonable_encoder({
+                    **approx_info,"estimates":final_result[:settings.SUMMARY_PREVIEW_ROWS]
+                })
+            return response
         else:
             # TODO
             # call the SQL Fixing Agent
-            print("Hii")
-            return "Invalid Query Generated"
-        
+            logger.warning("Validator rejected the query for %s",table_name)
+            return {"message":"Invalid Query Generated"}
+
+    except QueryRejected as e:
+        # over the cost budget, lane queue full or cancelled by statement_timeout
+        logger.warning("Query for %s not run : %s",table_name,e)
+        return {"message":str(e),"rejected":True}
+    except Exception as e:
+        logger.exception("Failed to analyze")
+        raise Exception("Failed to analyze",e)
+
+def batch_orchestrator(table_name,user_queries:List[str],db:session = get_db_session(),max_concurrency:int = 8,detailed = False):
+    """
+    Answer many questions against one dataset.
+    Metadata and planner context are built once, planning / validation / summaries
+    run on a bounded thread pool and each distinct SQL is executed only once.
+    """
+    try:
+        data = db.query(DatabaseMetadata).filter(DatabaseMetadata.table_name == table_name).first()
+        if data is None:
+            raise Exception(f"Dataset {table_name} not found")
+        table_metadata = data.table_metadata
+        if table_metadata["status"] != "ready":
+            return [{"query":q,"error":"Data processing still in progress please wait for sometime..!"} for q in user_queries]
+
+        context = planner_context(table_metadata)
+        catalog_json = json.dumps(column_type_catalog(table_metadata))
+        results = [{"query":q} for q in user_queries]
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            # 1) plan every question with the shared context
+            plans = list(pool.map(
+                lambda q: _safe(query_generator,table_name=table_name,user_query=q,table_metadata=table_metadata,context=context),
+                user_queries
+            ))
+
+            # 2) deduplicate identical compiled SQL
+            sql_to_idx: Dict[str,List[int]] = {}
+            for idx,plan in enumerate(plans):
+                if isinstance(plan,Exception):
+                    results[idx]["error"] = str(plan)
+                    continue
+                results[idx]["sql_query"] = plan["sql_query"]
+                sql_to_idx.setdefault(plan["sql_query"].strip(),[]).append(idx)
+            logger.info("Batch : %d questions, %d distinct queries",len(user_queries),len(sql_to_idx))
+            planned = sum(len(idxs) for idxs in sql_to_idx.values())
+            record_cache("batch_sql_dedupe",hit=True,count=planned - len(sql_to_idx))
+            record_cache("batch_sql_dedupe",hit=False,count=len(sql_to_idx))
+
+            # 3) validate each distinct query once, rule-based plans need no LLM check
+            distinct_sql = list(sql_to_idx.keys())
+            rules_sql = {q for q,idxs in sql_to_idx.items() if all(plans[i].get("planner") == "rules" for i in idxs)}
+            verdicts = list(pool.map(
+                lambda q: RULES_VERDICT if q in rules_sql else _safe(query_validator,TABLE_NAME=table_name,COLUMN_CATALOG_JSON=catalog_json,SQL_QUERY=q),
+                distinct_sql
+            ))
+
+            # 4) run the valid ones over one shared connection, each through the admission gate
+            rows_by_sql = {}
+            for sql_query,verdict in zip(distinct_sql,verdicts):
+                if isinstance(verdict,Exception):
+                    rows_by_sql[sql_query] = verdict
+                elif verdict.verdict.lower() != "correct":
+                    rows_by_sql[sql_query] = Exception("Invalid Query Generated")
+                else:
+                    try:
+                        with stage("sql_execution"):
+                            rows_by_sql[sql_query] = gate.run(db,sql_query,fetch_size=settings.SQL_FETCH_SIZE,max_rows=settings.SQL_MAX_ROWS)
+                        record_rows("sql_execution","returned",len(rows_by_sql[sql_query]))
+                    except Exception as e:
+                        db.rollback()
+                        rows_by_sql[sql_query] = e
+
+            # 5) summarize per question
+            jobs = []
+            for sql_query,idxs in sql_to_idx.items():
+                rows = rows_by_sql[sql_query]
+                for idx in idxs:
+                    if isinstance(rows,Exception):
+                        results[idx]["error"] = str(rows)
+                        continue
+                    jobs.append((idx,pool.submit(
+                        _safe,summarize_result,
+                        generated_json=plans[idx],
+                        user_query=user_queries[idx],
+                        rows=rows,
+                        truncated=len(rows) >= settings.SQL_MAX_ROWS,
+                        detailed=detailed
+                    )))
+            for idx,job in jobs:
+                message = job.result()
+                if isinstance(message,Exception):
+                    results[idx]["error"] = str(message)
+                else:
+                    results[idx]["message"] = message
+
+        return results
+    except Exception as e:
+        logger.exception("Failed to analyze")
+        raise Exception("Failed to analyze batch",e)
+    finally:
+        if db:
+            db.close()
+            logger.debug("Session is closed")
+
+def _safe(fn,**kwargs):
+    try:
+        return fn(**kwargs)
     except Exception as e:
-        print("Failed ..",e)
-        raise Exception("Failed to analyze",e)
\ No newline at end of file
+        return e
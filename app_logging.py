@@ -0,0 +1,45 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+from config import settings
+
+# -------------------------
+# Queue-backed logging: request threads only enqueue, a listener thread does the I/O
+# -------------------------
+
+_listener = None
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    # in-process queue, so skip the eager formatting QueueHandler does for pickling; the listener formats
+    def prepare(self, record):
+        return record
+
+def setup_logging(level: str = settings.LOG_LEVEL):
+    global _listener
+    if _listener is not None:
+        return
+    log_queue = queue.SimpleQueue()
+    stream = logging.StreamHandler()
+    stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_LazyQueueHandler(log_queue))
+
+def get_logger(name: str) -> logging.Logger:
+    setup_logging()
+    return logging.getLogger(name)
+
+def log_payload(logger: logging.Logger, msg: str, *args, rate: float = None):
+    """
+    DEBUG log for big payloads (metadata, SQL, LLM responses), sampled so
+    only a fraction of requests pay for formatting them.
+    """
+    rate = settings.LOG_PAYLOAD_SAMPLE_RATE if rate is None else rate
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < rate:
+        logger.debug(msg, *args)
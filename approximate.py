@@ -0,0 +1,92 @@
+import math
+from typing import Dict, Any, List, Optional, Tuple
+from shared_scan import aggregate_sql
+
+# -------------------------
+# Approximate answers: run the compiled aggregate over a TABLESAMPLE and scale it up
+# -------------------------
+
+# aggregates with an unbiased estimator from a uniform row sample
+SCALABLE = ("SUM", "COUNT", "AVG")
+Z_SCORES = {0.8: 1.282, 0.9: 1.645, 0.95: 1.96, 0.98: 2.326, 0.99: 2.576}
+SAMPLE_METHODS = ("BERNOULLI", "SYSTEM")
+
+def sample_percent(row_count: int, target_rows: int, min_rows: int) -> Optional[float]:
+    """
+    Sample size in percent that leaves about target_rows rows,
+    None when the table is too small for sampling to pay off.
+    """
+    if not row_count or row_count < min_rows:
+        return None
+    percent = 100.0 * target_rows / row_count
+    if percent >= 50:
+        return None
+    return round(max(percent, 0.01), 4)
+
+def is_approximable(parts: Dict[str, Any]) -> bool:
+    return bool(parts["metrics"]) and all(func in SCALABLE for func, _ in parts["metrics"])
+
+def build_sample_sql(table_name: str, parts: Dict[str, Any], percent: float, method: str = "BERNOULLI") -> str:
+    """
+    Same query as sql_builder over a sample of the table. Every metric m<j> also returns
+    what its standard error needs: sum of squares for SUM, stddev and count for AVG.
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Unsupported sample method '{method}'.")
+    select_parts = [select_value for _, select_value in parts["group_by"]]
+    for j, (func, expr) in enumerate(parts["metrics"]):
+        select_parts.append(f"{func}({expr}) AS m{j}")
+        if func == "SUM":
+            select_parts.append(f"SUM(({expr})::double precision * ({expr})) AS m{j}_ss")
+        elif func == "AVG":
+            select_parts.append(f"STDDEV_SAMP({expr}) AS m{j}_sd")
+            select_parts.append(f"COUNT({expr}) AS m{j}_n")
+
+    where_sql = "".join(f" AND {predicate}" for predicate in parts["where"])
+    group_sql = ", ".join(column for column, _ in parts["group_by"])
+    order_sql = ", ".join(
+        f"{aggregate_sql(func, column)} {direction}" if func else f"{column} {direction}"
+        for func, column, direction in parts["order_by"]
+    )
+    sql = f"SELECT {', '.join(select_parts)} FROM {table_name} TABLESAMPLE {method} ({percent}) WHERE 1=1{where_sql}"
+    if group_sql:
+        sql += f" GROUP BY {group_sql}"
+    if order_sql:
+        sql += f" ORDER BY {order_sql}"
+    if parts["limit"]:
+        sql += f" LIMIT {parts['limit']}"
+    return sql
+
+def _estimate(func: str, row: Dict[str, Any], j: int, fraction: float) -> Tuple[Optional[float], Optional[float]]:
+    # Horvitz-Thompson for SUM / COUNT under independent row sampling, plain mean for AVG
+    value = row.get(f"m{j}")
+    if value is None:
+        return None, None
+    value = float(value)
+    if func == "SUM":
+        ss = float(row.get(f"m{j}_ss") or 0.0)
+        return value / fraction, math.sqrt(max((1 - fraction) * ss, 0.0)) / fraction
+    if func == "COUNT":
+        return float(round(value / fraction)), math.sqrt((1 - fraction) * value) / fraction
+    sd, n = row.get(f"m{j}_sd"), row.get(f"m{j}_n") or 0
+    if sd is None or n < 2:
+        return value, None
+    return value, float(sd) / math.sqrt(n) * math.sqrt(1 - fraction)
+
+def scale_sample_rows(rows: List[Dict[str, Any]], parts: Dict[str, Any], percent: float, confidence: float = 0.95) -> List[Dict[str, Any]]:
+    """
+    Rows shaped like the exact query's (group columns + one key per aggregate),
+    plus <key>_margin, the half-width of the confidence interval.
+    """
+    fraction = percent / 100.0
+    z = Z_SCORES.get(confidence, 1.96)
+    out = []
+    for row in rows:
+        item = {column: row[column] for column, _ in parts["group_by"]}
+        for j, (func, _) in enumerate(parts["metrics"]):
+            key = func.lower()
+            estimate, se = _estimate(func, row, j, fraction)
+            item[key] = estimate
+            item[f"{key}_margin"] = z * se if se is not None else None
+        out.append(item)
+    return out
@@ -0,0 +1,89 @@
+import json
+import time
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+# -------------------------
+# Deterministic stand-in for ai.llm, no network
+# -------------------------
+
+def _plan(filters=None, extra_filter=None, metrics=None, group_by=None, order_by=None, limit=0, notes=None):
+    base = {"region": None, "item_type": None, "channel": None, "date": None}
+    base.update(filters or {})
+    return {
+        "filters": base,
+        "extra_filter": extra_filter or [],
+        "metrics": metrics or [{"SUM": "revenue"}],
+        "group_by": group_by or [],
+        "order_by": order_by or [],
+        "limit": limit,
+        "notes": notes or [],
+    }
+
+# canned Answer plans, keyed by question
+CANNED_PLANS = {
+    "total revenue by region in 2004": _plan(
+        filters={"date": ["2004-01-01", "2004-12-31"]},
+        metrics=[{"SUM": "revenue"}],
+        group_by=["region"],
+    ),
+    "units sold for Classic Cars in Q2 2005": _plan(
+        filters={"item_type": ["Classic Cars"], "date": ["2005-04-01", "2005-06-30"]},
+        metrics=[{"SUM": "units_sold"}],
+    ),
+    "average selling price by product line": _plan(
+        metrics=[{"AVG": "avg_selling_price"}],
+        group_by=["item_type"],
+    ),
+    "top 5 countries by sales": _plan(
+        metrics=[{"SUM": "revenue"}],
+        group_by=["country"],
+        order_by=[{"funtion": "SUM", "column_name": "revenue", "order_by": "DESC"}],
+        limit=5,
+    ),
+    "number of shipped orders per deal size": _plan(
+        extra_filter=[{"column": "status", "op": "=", "value": "Shipped"}],
+        metrics=[{"COUNT": "ordernumber"}],
+        group_by=["dealsize"],
+    ),
+}
+
+VALIDATOR_VERDICT = {"verdict": "correct", "reason": "Looks good.", "violations": [], "suggested_fix": None}
+
+def _question(text: str) -> str:
+    for question in CANNED_PLANS:
+        if question in text:
+            return question
+    return next(iter(CANNED_PLANS))
+
+def make_fake_llm(latency_ms: float = 0):
+    """
+    Runnable that answers the planner, validator and summarizer prompts of ai.py.
+    latency_ms simulates the upstream round trip.
+    """
+    def respond(prompt_value):
+        if latency_ms:
+            time.sleep(latency_ms / 1000)
+        messages = prompt_value.to_messages()
+        system, human = messages[0].content, messages[-1].content
+        if "query planner" in system:
+            content = json.dumps({"answer": CANNED_PLANS[_question(human)]})
+        elif "Validator" in system:
+            content = json.dumps(VALIDATOR_VERDICT)
+        else:
+            content = "Here is the answer based on the returned rows.\n- Filters and metrics as requested."
+        prompt_chars = sum(len(m.content) for m in messages)
+        # everything before the last message is the stable prefix a provider would cache
+        usage = {
+            "input_tokens": prompt_chars // 4,
+            "output_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+            "input_token_details": {"cache_read": (prompt_chars - len(human)) // 4}
+        }
+        return AIMessage(content=content, usage_metadata=usage)
+    return RunnableLambda(respond)
+
+def install(latency_ms: float = 0):
+    import ai
+    ai.llm = make_fake_llm(latency_ms)
+    return ai
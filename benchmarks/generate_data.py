@@ -0,0 +1,96 @@
+import argparse
+import numpy as np
+import pandas as pd
+
+# -------------------------
+# Synthetic sales CSV shaped like Daset/sales_data_sample.csv
+# -------------------------
+
+STATUSES = ["Shipped", "Disputed", "In Process", "Cancelled", "On Hold", "Resolved"]
+STATUS_WEIGHTS = [0.92, 0.01, 0.02, 0.02, 0.02, 0.01]
+PRODUCT_LINES = ["Motorcycles", "Classic Cars", "Trucks and Buses", "Vintage Cars", "Planes", "Ships", "Trains"]
+DEAL_SIZES = ["Small", "Medium", "Large"]
+# (country, city, state, territory)
+LOCATIONS = [
+    ("USA", "NYC", "NY", "NA"), ("USA", "San Francisco", "CA", "NA"), ("USA", "Boston", "MA", "NA"),
+    ("France", "Paris", "", "EMEA"), ("France", "Reims", "", "EMEA"), ("Spain", "Madrid", "", "EMEA"),
+    ("UK", "Liverpool", "", "EMEA"), ("Germany", "Frankfurt", "", "EMEA"), ("Italy", "Torino", "", "EMEA"),
+    ("Australia", "Melbourne", "Victoria", "APAC"), ("Singapore", "Singapore", "", "APAC"),
+    ("Japan", "Minato-ku", "Tokyo", "Japan"), ("Canada", "Vancouver", "BC", "NA"),
+]
+FIRST_NAMES = ["Kwai", "Paul", "Daniel", "Julie", "Julie", "Juri", "Mory", "Leslie", "Valarie", "Diego"]
+LAST_NAMES = ["Yu", "Henriot", "Da Cunha", "Young", "Brown", "Hirano", "Kentary", "Frick", "Nelson", "Freyre"]
+
+HEADER = [
+    "ORDERNUMBER", "QUANTITYORDERED", "PRICEEACH", "ORDERLINENUMBER", "SALES", "ORDERDATE", "STATUS",
+    "QTR_ID", "MONTH_ID", "YEAR_ID", "PRODUCTLINE", "MSRP", "PRODUCTCODE", "CUSTOMERNAME", "PHONE",
+    "ADDRESSLINE1", "ADDRESSLINE2", "CITY", "STATE", "POSTALCODE", "COUNTRY", "TERRITORY",
+    "CONTACTLASTNAME", "CONTACTFIRSTNAME", "DEALSIZE",
+]
+
+def generate_chunk(rng: np.random.Generator, start: int, rows: int, extra_columns: int = 0) -> pd.DataFrame:
+    qty = rng.integers(6, 98, rows)
+    price = np.round(rng.uniform(26.88, 100.0, rows), 2)
+    sales = np.round(qty * price, 2)
+    dates = pd.Timestamp("2003-01-01") + pd.to_timedelta(rng.integers(0, 880, rows), unit="D")
+    loc = rng.integers(0, len(LOCATIONS), rows)
+    customer = rng.integers(0, 92, rows)
+    product = rng.integers(0, 109, rows)
+
+    df = pd.DataFrame({
+        "ORDERNUMBER": 10100 + (start + np.arange(rows)) // 10,
+        "QUANTITYORDERED": qty,
+        "PRICEEACH": price,
+        "ORDERLINENUMBER": rng.integers(1, 19, rows),
+        "SALES": sales,
+        "ORDERDATE": [f"{d.month}/{d.day}/{d.year} 0:00" for d in dates],
+        "STATUS": rng.choice(STATUSES, rows, p=STATUS_WEIGHTS),
+        "QTR_ID": dates.quarter,
+        "MONTH_ID": dates.month,
+        "YEAR_ID": dates.year,
+        "PRODUCTLINE": np.array(PRODUCT_LINES)[product % len(PRODUCT_LINES)],
+        "MSRP": 33 + (product * 7) % 182,
+        "PRODUCTCODE": [f"S{10 + p % 90}_{1000 + p * 37}" for p in product],
+        "CUSTOMERNAME": [f"Customer {c} Inc." for c in customer],
+        "PHONE": [f"212555{c:04d}" for c in customer],
+        "ADDRESSLINE1": [f"{c * 13 + 1} Main Street" for c in customer],
+        "ADDRESSLINE2": "",
+        "CITY": [LOCATIONS[i][1] for i in loc],
+        "STATE": [LOCATIONS[i][2] for i in loc],
+        "POSTALCODE": [f"{10000 + c * 17}" for c in customer],
+        "COUNTRY": [LOCATIONS[i][0] for i in loc],
+        "TERRITORY": [LOCATIONS[i][3] for i in loc],
+        "CONTACTLASTNAME": np.array(LAST_NAMES)[customer % len(LAST_NAMES)],
+        "CONTACTFIRSTNAME": np.array(FIRST_NAMES)[customer % len(FIRST_NAMES)],
+        "DEALSIZE": np.where(sales < 3000, DEAL_SIZES[0], np.where(sales < 7000, DEAL_SIZES[1], DEAL_SIZES[2])),
+    }, columns=HEADER)
+
+    # widen the table, alternating numeric and low-cardinality text columns
+    for i in range(extra_columns):
+        if i % 2 == 0:
+            df[f"EXTRA_NUM_{i}"] = np.round(rng.normal(100, 25, rows), 3)
+        else:
+            df[f"EXTRA_TXT_{i}"] = np.array([f"val_{k}" for k in range(50)])[rng.integers(0, 50, rows)]
+    return df
+
+def generate_csv(path: str, rows: int, extra_columns: int = 0, seed: int = 42, chunk_size: int = 200_000) -> str:
+    """
+    Write `rows` synthetic rows to `path` in chunks so 10M rows never sit in memory at once.
+    """
+    rng = np.random.default_rng(seed)
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        while written < rows:
+            n = min(chunk_size, rows - written)
+            generate_chunk(rng, written, n, extra_columns).to_csv(f, index=False, header=(written == 0))
+            written += n
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic sales CSV")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--extra-columns", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="synthetic_sales.csv")
+    args = parser.parse_args()
+    print(generate_csv(args.out, args.rows, args.extra_columns, args.seed))
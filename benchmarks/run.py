@@ -0,0 +1,179 @@
+"""
+Offline benchmark suite for the ingest and analyse hot paths.
+
+    python -m benchmarks.run --rows 10000 --out bench.json
+    python -m benchmarks.run --rows 1000000 --extra-columns 10 --skip-db
+
+DB benchmarks run against DATABASE_URL (a local Postgres). The LLM is replaced by
+benchmarks.fake_llm, so OPENAI_API_KEY / BRAINTRUST_API_KEY can be any value.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+import pandas as pd
+
+from benchmarks.generate_data import generate_csv
+
+
+def timeit(fn, repeat: int = 3):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "runs": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "max_s": max(times),
+    }, result
+
+
+# -------------------------
+# Pure pandas benchmarks
+# -------------------------
+
+def bench_parse(path: str, repeat: int):
+    from dataset_store import NULL_TOKENS, normalize_columns, compact_string_columns
+    from infer_metadata import infer_col_type, profile_df, infer_numeric_storage, coerce_numeric
+
+    results = {}
+    with open(path, "rb") as f:
+        content = f.read()
+
+    results["csv_parse"], df = timeit(lambda: pd.read_csv(io.BytesIO(content), na_values=NULL_TOKENS), repeat)
+    names = list(df.columns) * 1000
+    results["normalize_columns"], _ = timeit(lambda: [normalize_columns(c) for c in names], repeat)
+    df.columns = [normalize_columns(c) for c in df.columns]
+    results["infer_col_type"], schema = timeit(lambda: {c: infer_col_type(df[c], sample_size=1000) for c in df.columns}, repeat)
+    results["profile_df"], _ = timeit(lambda: profile_df(df, sample_size=500), repeat)
+
+    numeric = [col for col, ctype in schema.items() if ctype == "numeric"]
+    results["infer_numeric_storage"], storage = timeit(lambda: {c: infer_numeric_storage(df[c]) for c in numeric}, repeat)
+    for col, ctype in schema.items():
+        if ctype == "date":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif ctype == "numeric":
+            df[col] = coerce_numeric(df[col], storage[col])
+    results["compact_string_columns"], _ = timeit(lambda: compact_string_columns(df, schema), 1)
+    results["frame_bytes"] = int(df.memory_usage(deep=True).sum())
+    return results, df, schema, storage
+
+
+# -------------------------
+# Postgres + fake LLM benchmarks
+# -------------------------
+
+def bench_db(df: pd.DataFrame, schema: dict, storage: dict, repeat: int, latency_ms: float, keep: bool):
+    from sqlalchemy import text
+    from db import engine, get_db_session
+    from admission import gate
+    from config import settings
+    from dataset_store import make_table_name, create_table_from_df, insert_data
+    from infer_metadata import infer_and_store_metadata
+    from model import DatabaseMetadata
+    from benchmarks.fake_llm import CANNED_PLANS, install
+
+    ai = install(latency_ms)
+    results = {}
+    table_name = make_table_name("bench")
+
+    table = create_table_from_df(eng=engine, table_name=table_name, schema=schema, storage=storage)
+    results["insert_data"], _ = timeit(lambda: insert_data(bind=engine, table=table, df=df), 1)
+
+    db = get_db_session()
+    metadata = DatabaseMetadata(file_name="bench.csv", table_name=table_name, table_metadata={"status": "processing", "storage": storage})
+    db.add(metadata)
+    db.commit()
+    db.refresh(metadata)
+    dataset_id = metadata.id
+    db.close()
+
+    results["infer_and_store_metadata"], meta = timeit(
+        lambda: infer_and_store_metadata(get_db_session(), dataset_id, "bench.csv", table_name), 1
+    )
+
+    from fast_planner import plan_question
+    results["fast_planner"], _ = timeit(lambda: [plan_question(q, meta) for q in CANNED_PLANS], repeat)
+
+    queries = {}
+    for question, plan in CANNED_PLANS.items():
+        answer = ai.Answer.model_validate(plan).model_dump()
+        queries[question] = ai.sql_builder(db_result=meta, table_name=table_name, data=answer)
+    results["sql_builder"], _ = timeit(
+        lambda: [ai.sql_builder(db_result=meta, table_name=table_name, data=ai.Answer.model_validate(p).model_dump()) for p in CANNED_PLANS.values()],
+        repeat
+    )
+
+    def run_sql(sql_query):
+        session = get_db_session()
+        try:
+            return gate.run(session, sql_query, fetch_size=settings.SQL_FETCH_SIZE)
+        finally:
+            session.close()
+
+    for question, sql_query in queries.items():
+        results[f"run_sql[{question}]"], _ = timeit(lambda: run_sql(sql_query), repeat)
+        results[f"orchestrator[{question}]"], _ = timeit(
+            lambda: ai.orchestrator(table_name=table_name, user_query=question, db=get_db_session()), repeat
+        )
+
+    if not keep:
+        db = get_db_session()
+        db.query(DatabaseMetadata).filter(DatabaseMetadata.id == dataset_id).delete()
+        db.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+        db.commit()
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--rows", type=int, default=10_000, help="10000 / 1000000 / 10000000")
+    parser.add_argument("--extra-columns", type=int, default=0, help="widen the synthetic table")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency-ms", type=float, default=0, help="simulated LLM round trip")
+    parser.add_argument("--csv", help="use an existing CSV instead of generating one")
+    parser.add_argument("--skip-db", action="store_true", help="only run the pandas benchmarks")
+    parser.add_argument("--keep", action="store_true", help="keep the benchmark table and metadata row")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="capstone_bench_")
+    path = args.csv or generate_csv(os.path.join(tmp_dir, "sales.csv"), args.rows, args.extra_columns)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "rows": args.rows,
+            "extra_columns": args.extra_columns,
+            "csv": path,
+            "llm_latency_ms": args.llm_latency_ms,
+        },
+        "results": {},
+    }
+
+    parse_results, df, schema, storage = bench_parse(path, args.repeat)
+    report["results"].update(parse_results)
+    if not args.skip_db:
+        report["results"].update(bench_db(df, schema, storage, args.repeat, args.llm_latency_ms, args.keep))
+
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
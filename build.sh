@@ -6,4 +6,8 @@ alembic upgrade head
 # #frontend
 cd frontend
 npm install
-npm run build
\ No newline at end of file
+npm run build
+
+# precompressed .gz / .br next to the built assets
+cd ..
+python precompress.py frontend/build/client
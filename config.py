@@ -1,11 +1,57 @@
 from pydantic import AnyUrl
 from pydantic_settings import BaseSettings
+from typing import Dict
 
 class Settings(BaseSettings):
     DATABASE_URL: AnyUrl
     PRODUCTION: bool
-    OPENAI_API_KEY: str
-    BRAINTRUST_API_KEY: str
+    OPENAI_API_KEY: str | None = None
+    BRAINTRUST_API_KEY: str | None = None
+    WARMUP_ON_STARTUP: bool = True
+    DICTIONARY_MAX_CARDINALITY: int = 255
+    INSERT_BATCH_ROWS: int = 50000
+    UPLOAD_DEDUP_ENABLED: bool = True
+    BATCH_MAX_CONCURRENCY: int = 8
+    SHARED_SCAN_WINDOW_MS: int = 5
+    SHARED_SCAN_MAX_BATCH: int = 32
+    SQL_FETCH_SIZE: int = 1000
+    SQL_MAX_ROWS: int = 10000
+    QUERY_ADMISSION_ENABLED: bool = True
+    QUERY_FAST_LANE_CONCURRENCY: int = 8
+    QUERY_SLOW_LANE_CONCURRENCY: int = 2
+    QUERY_FAST_MAX_COST: float = 100000
+    QUERY_FAST_MAX_ROWS: float = 10000
+    QUERY_MAX_COST: float = 10000000
+    QUERY_FAST_TIMEOUT_MS: int = 5000
+    QUERY_SLOW_TIMEOUT_MS: int = 60000
+    QUERY_QUEUE_TIMEOUT_SECONDS: float = 30
+    APPROX_SAMPLE_METHOD: str = "BERNOULLI"
+    APPROX_TARGET_ROWS: int = 200000
+    APPROX_MIN_ROWS: int = 1000000
+    APPROX_CONFIDENCE: float = 0.95
+    SUMMARY_PREVIEW_ROWS: int = 50
+    RESULT_PAGE_SIZE: int = 500
+    OTEL_ENABLED: bool = False
+    LOG_LEVEL: str = "INFO"
+    LOG_PAYLOAD_SAMPLE_RATE: float = 0.01
+    SQL_ECHO: bool = False
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_TIMEOUT_SECONDS: Dict[str,float] = {"planner_llm": 60, "validator_llm": 30, "summarizer_llm": 60}
+    LLM_MAX_RETRIES: int = 2
+    LLM_RETRY_BUDGET_SECONDS: float = 90
+    FAST_PLANNER_ENABLED: bool = True
+    FAST_PLANNER_MIN_CONFIDENCE: float = 0.9
+    LOCAL_SUMMARY_ENABLED: bool = True
+    LOCAL_SUMMARY_MAX_ROWS: int = 10
+    LOCAL_SUMMARY_MAX_METRICS: int = 3
+    JOB_QUEUE_ENABLED: bool = True
+    EMBEDDED_WORKER: bool = True
+    WORKER_PROCESSES: int = 2
+    WORKER_METRICS_PORT: int = 0
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_POLL_SECONDS: float = 1.0
+    JOB_STALE_SECONDS: float = 900
+    PROFILE_COLUMN_WORKERS: int = 4
     class Config:
         env_file = ".env"
         enf_file_encoding = "utf-8"
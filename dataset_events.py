@@ -0,0 +1,145 @@
+import asyncio
+import json
+import select
+import threading
+import time
+from typing import Dict, Any, Optional, Set, Tuple
+from sqlalchemy import text
+from config import settings
+from db import engine
+from file_listing import invalidate_file_list
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------
+# In-process event bus for dataset ingest / profiling progress
+# Publishers are request handlers and background threads, subscribers are SSE streams
+# -------------------------
+
+TERMINAL_EVENTS = ("ready", "failed")
+
+class DatasetEventBus:
+    def __init__(self, max_topics: int = 1000):
+        self.max_topics = max_topics
+        self._lock = threading.Lock()
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def publish(self, table_name: str, event: str, **data):
+        message = {"table_name": table_name, "event": event, "ts": time.time(), **data}
+        with self._lock:
+            self._last.pop(table_name, None)
+            self._last[table_name] = message
+            if len(self._last) > self.max_topics:
+                self._last.pop(next(iter(self._last)))
+            subscribers = list(self._subscribers.get(table_name, ()))
+        logger.debug("Dataset event : %s", message)
+        for loop, queue in subscribers:
+            # safe from any thread, the queue belongs to the subscriber's loop
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+    def last_event(self, table_name: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._last.get(table_name)
+
+    def subscribe(self, table_name: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(table_name, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, table_name: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = self._subscribers.get(table_name, set())
+            for item in [s for s in subscribers if s[1] is queue]:
+                subscribers.discard(item)
+            if not subscribers:
+                self._subscribers.pop(table_name, None)
+
+bus = DatasetEventBus()
+
+# -------------------------
+# Cross-process delivery: the job worker runs in another process, so with the
+# job queue on, events go through Postgres NOTIFY and every web process listens
+# -------------------------
+
+CHANNEL = "dataset_events"
+_listener: Optional[threading.Thread] = None
+
+def publish(table_name: str, event: str, **data):
+    if not settings.JOB_QUEUE_ENABLED:
+        bus.publish(table_name, event, **data)
+        return
+    payload = json.dumps({"table_name": table_name, "event": event, **data}, default=str)[:7900]
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": payload})
+    except Exception:
+        logger.warning("NOTIFY failed, publishing %s for %s locally only", event, table_name, exc_info=True)
+        bus.publish(table_name, event, **data)
+
+def _listen(stop: threading.Event):
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = engine.raw_connection()
+            conn.dbapi_connection.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            logger.info("Listening for dataset events")
+            while not stop.is_set():
+                if select.select([conn.dbapi_connection], [], [], 5) == ([], [], []):
+                    continue
+                conn.dbapi_connection.poll()
+                while conn.dbapi_connection.notifies:
+                    notify = conn.dbapi_connection.notifies.pop(0)
+                    message = json.loads(notify.payload)
+                    if message["event"] in TERMINAL_EVENTS:
+                        # the status changed in another process, drop this process' listing cache
+                        invalidate_file_list()
+                    bus.publish(message.pop("table_name"), message.pop("event"), **message)
+        except Exception:
+            logger.exception("Dataset event listener failed, reconnecting")
+            stop.wait(5)
+        finally:
+            if conn is not None:
+                # the session state (LISTEN, autocommit) must not go back to the pool
+                conn.invalidate()
+
+def start_listener(stop: threading.Event) -> threading.Thread:
+    global _listener
+    if _listener is None or not _listener.is_alive():
+        _listener = threading.Thread(target=_listen, args=(stop,), name="dataset-events", daemon=True)
+        _listener.start()
+    return _listener
+
+def sse_message(message: Dict[str, Any]) -> str:
+    return f"event: {message['event']}\ndata: {json.dumps(message, default=str)}\n\n"
+
+async def event_stream(table_name: str, current: Optional[Dict[str, Any]] = None, keepalive: float = 15.0):
+    """
+    Server-sent events for one dataset, ends after the ready / failed event.
+    `current` is the state read from the database when the bus has not seen the dataset.
+    """
+    queue = bus.subscribe(table_name)
+    try:
+        first = bus.last_event(table_name) or current
+        if first is not None:
+            yield sse_message(first)
+            if first["event"] in TERMINAL_EVENTS:
+                return
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if first is not None and message["ts"] <= first["ts"]:
+                # published between subscribe and the first read, already sent
+                continue
+            yield sse_message(message)
+            if message["event"] in TERMINAL_EVENTS:
+                return
+    finally:
+        bus.unsubscribe(table_name, queue)
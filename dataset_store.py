@@ -1,9 +1,21 @@
+import hashlib
+import io
+import json
+import os
 import re
 import uuid
+from contextlib import contextmanager
 import pandas as pd
-from sqlalchemy import MetaData, Table, Column, Text,Column, Text, Numeric,Date,Boolean
-from sqlalchemy.engine import Engine
-from infer_metadata import infer_col_type
+from typing import Any, Dict, List, Optional, Union
+from sqlalchemy import MetaData, Table, Column, Text,Column, Text, Numeric,Date,Boolean,SmallInteger,Integer,BigInteger,Double,inspect,text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Connection, Engine
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+#Extra cell values read as null, on top of the pandas defaults ("", "NA", "NaN", "None", "null" ...)
+NULL_TOKENS = ["NaT", "nat", "none"]
 
 #Normalize the columns
 def normalize_columns(col:str) ->str:
@@ -18,10 +30,150 @@ def normalize_columns(col:str) ->str:
 def make_table_name(prefix:str = "dataset") -> str:
     return f"{prefix}_{uuid.uuid4().hex[:12]}"
 
+#Name of the lookup table holding the dictionaries of a dataset
+def dictionary_table_name(table_name:str) -> str:
+    return f"{table_name}_dict"
+
+#Pick the low-cardinality string columns worth dictionary-encoding
+def detect_dictionary_columns(df: pd.DataFrame,schema:dict,max_cardinality:int = 255,max_ratio:float = 0.5) -> List[str]:
+    dict_cols = []
+    row_count = len(df)
+    if row_count == 0:
+        return dict_cols
+    for col,ctype in schema.items():
+        if ctype != "string":
+            continue
+        distinct_count = int(df[col].nunique(dropna=True))
+        if 0 < distinct_count <= max_cardinality and distinct_count / row_count <= max_ratio:
+            dict_cols.append(col)
+    return dict_cols
+
+#Replace the string values with smallint codes, codes follow the sorted value order
+def encode_dictionary_columns(df: pd.DataFrame,columns:List[str]) -> Dict[str,List[str]]:
+    dictionaries = {}
+    for col in columns:
+        values = df[col].astype("string")
+        dictionary = sorted(values.dropna().unique().tolist())
+        df[col] = _dictionary_codes(values,dictionary)
+        dictionaries[col] = dictionary
+    return dictionaries
+
+#Encode a new batch against existing dictionaries, unseen values get the next free codes
+#so the stored codes stay valid; after that the codes no longer follow the value order,
+#queries sort on the decoded value
+def extend_dictionary_columns(df: pd.DataFrame,dictionaries:Dict[str,List[str]]) -> Dict[str,int]:
+    offsets = {}
+    for col,dictionary in dictionaries.items():
+        if col not in df.columns:
+            continue
+        offsets[col] = len(dictionary)
+        values = df[col].astype("string")
+        known = set(dictionary)
+        for v in values.dropna().unique().tolist():
+            if v not in known:
+                known.add(v)
+                dictionary.append(v)
+        if len(dictionary) > 32767:
+            raise ValueError(f"Column '{col}' has too many distinct values for dictionary encoding.")
+        df[col] = _dictionary_codes(values,dictionary)
+    return offsets
+
+#Vectorized lookup: positions in the dictionary as nullable smallints
+def _dictionary_codes(values: pd.Series,dictionary:List[str]) -> pd.Series:
+    codes = pd.Categorical(values,categories=dictionary).codes
+    return pd.Series(codes,index=values.index).astype("Int16").mask(codes < 0)
+
+#Low-cardinality string columns become categoricals, the rest Arrow-backed strings when pyarrow is installed
+def compact_string_columns(df: pd.DataFrame,schema:dict,max_ratio:float = 0.5,skip:Optional[List[str]] = None):
+    skip = set(skip or [])
+    try:
+        import pyarrow  # noqa: F401
+        string_dtype = pd.StringDtype("pyarrow")
+    except ImportError:
+        string_dtype = None
+    row_count = len(df)
+    for col,ctype in schema.items():
+        if ctype != "string" or col in skip or row_count == 0:
+            continue
+        if df[col].nunique(dropna=True) / row_count <= max_ratio:
+            df[col] = df[col].astype("category")
+        elif string_dtype is not None:
+            df[col] = df[col].astype(string_dtype)
+
+#Translate plain values to dictionary codes, unknown values map to -1 so they match nothing
+def encode_values(dictionary:List[str],values:List) -> List[int]:
+    lookup = {v:i for i,v in enumerate(dictionary)}
+    return [lookup.get(str(v),-1) for v in values]
+
+#SQL expression turning a code column back into its string value
+def decode_expression(column:str,dictionary:List[str]) -> str:
+    items = ", ".join("'" + v.replace("'","''") + "'" for v in dictionary)
+    return f"(ARRAY[{items}]::text[])[{column} + 1]"
+
+#Content address of an upload: hash of the raw bytes + detected encoding + normalized header
+#+ the options that change how it is loaded (same bytes loaded differently are different datasets)
+def upload_fingerprint(content_sha256:str,encoding:str,columns:List[str],options:Optional[Dict[str,Any]] = None) -> str:
+    h = hashlib.sha256(content_sha256.encode("ascii"))
+    h.update(b"\0" + (encoding or "").lower().encode("ascii","replace"))
+    h.update(b"\0" + "\x1f".join(columns).encode("utf-8"))
+    h.update(b"\0" + json.dumps(options or {},sort_keys=True,default=str).encode("utf-8"))
+    return h.hexdigest()
+
 #Create Table
-def create_table_from_df(eng: Engine,table_name:str,schema:dict) -> Table:
-    print("engine dialect: ",eng.dialect.name)
-    print("engine url: ",eng.url)
+#SQLAlchemy type for a numeric storage name from infer_numeric_storage
+def storage_type(storage:Optional[str]):
+    if not storage or storage == "numeric":
+        return Numeric
+    fixed = {"smallint": SmallInteger, "integer": Integer, "bigint": BigInteger, "double precision": Double}
+    if storage in fixed:
+        return fixed[storage]
+    precision,scale = re.fullmatch(r"numeric\((\d+),(\d+)\)",storage).groups()
+    return Numeric(int(precision),int(scale))
+
+#Smallest storage that holds both the stored values and a new batch, needed is None when the batch has no values
+def widen_storage(stored:str,needed:Optional[str]) -> str:
+    ints = ["smallint","integer","bigint"]
+    int_digits = {"smallint":5,"integer":10,"bigint":19}
+    if needed is None or stored == needed or stored == "numeric":
+        return stored
+    if needed == "numeric":
+        return needed
+    if stored in ints and needed in ints:
+        return max(stored,needed,key=ints.index)
+    if "double precision" in (stored,needed):
+        # a bigint does not fit a double exactly
+        return "numeric" if "bigint" in (stored,needed) else "double precision"
+    def digits(storage):
+        if storage in int_digits:
+            return int_digits[storage],0
+        precision,scale = map(int,re.fullmatch(r"numeric\((\d+),(\d+)\)",storage).groups())
+        return precision - scale,scale
+    (int1,scale1),(int2,scale2) = digits(stored),digits(needed)
+    scale = max(scale1,scale2)
+    precision = max(int1,int2) + scale
+    return f"numeric({precision},{scale})" if precision <= 1000 else "numeric"
+
+#Writes below take an engine (own transaction, committed on return) or a connection
+#(joins the caller's transaction, e.g. a session's, and the caller commits)
+@contextmanager
+def _begin(bind: Union[Engine,Connection]):
+    if isinstance(bind,Engine):
+        with bind.begin() as conn:
+            yield conn
+    else:
+        yield bind
+
+#Change column types in place, used when an appended batch outgrows a narrowed column
+def alter_column_types(bind: Union[Engine,Connection],table_name:str,storage:Dict[str,str]):
+    if not storage:
+        return
+    changes = ", ".join(f'ALTER COLUMN "{col}" TYPE {sql_type}' for col,sql_type in storage.items())
+    logger.info("Widening %s : %s",table_name,storage)
+    with _begin(bind) as conn:
+        conn.execute(text(f'ALTER TABLE "{table_name}" {changes}'))
+
+def create_table_from_df(eng: Engine,table_name:str,schema:dict,dictionary_columns:Optional[List[str]] = None,storage:Optional[Dict[str,str]] = None) -> Table:
+    logger.debug("Creating %s on %s",table_name,eng.dialect.name)
     md = MetaData()
     data_type_dict = {
         "string": Text,
@@ -29,24 +181,156 @@ def create_table_from_df(eng: Engine,table_name:str,schema:dict) -> Table:
         "numeric": Numeric,
         "date": Date
     }
+    dictionary_columns = set(dictionary_columns or [])
+    storage = storage or {}
     cols = [Column("__id",Text,primary_key=True)]
     for key,value in schema.items():
-        cols.append(Column(key,data_type_dict[value],nullable=True))
+        col_type = SmallInteger if key in dictionary_columns else data_type_dict[value]
+        if value == "numeric" and key in storage:
+            col_type = storage_type(storage[key])
+        cols.append(Column(key,col_type,nullable=True))
     
     table = Table(table_name,md,*cols)
+    if dictionary_columns:
+        Table(
+            dictionary_table_name(table_name),md,
+            Column("column_name",Text,primary_key=True),
+            Column("code",SmallInteger,primary_key=True),
+            Column("value",Text,nullable=False)
+        )
     md.create_all(eng)
 
     return table
 
-#Insert Into Table
-def insert_data(engine: Engine, table: Table, df: pd.DataFrame,batch_size:int = 1000):
-    print("Data Insertion is started ..!")
-    df2 = df.copy()
+#Time buckets materialized for the date role, as stored generated columns
+TIME_BUCKETS = ("year","quarter","month")
+
+#Internal columns (row key, time buckets) start with "__", normalized user columns never do
+def is_internal_column(col:str) -> bool:
+    return col.startswith("__")
+
+def time_bucket_columns(date_col:str) -> Dict[str,str]:
+    return {bucket:f"__{date_col}_{bucket}" for bucket in TIME_BUCKETS}
+
+#Add year / quarter / month columns computed by Postgres from the date column (appends fill them too)
+#plus indexes for range filters and time grouping. Runs on the caller's session / connection
+def add_time_buckets(conn,table_name:str,date_col:str) -> Optional[Dict[str,str]]:
+    existing = dict(conn.execute(
+        text("SELECT column_name, data_type FROM information_schema.columns WHERE table_name = :t"),
+        {"t":table_name}
+    ).all())
+    # generated columns need an immutable expression, a text column cast to date is not
+    if existing.get(date_col) != "date":
+        return None
+    columns = time_bucket_columns(date_col)
+    source = f'("{date_col}")::timestamp'
+    definitions = {
+        "year": f"smallint GENERATED ALWAYS AS (date_part('year', {source})::smallint) STORED",
+        "quarter": f"smallint GENERATED ALWAYS AS (date_part('quarter', {source})::smallint) STORED",
+        "month": f"date GENERATED ALWAYS AS (date_trunc('month', {source})::date) STORED",
+    }
+    adds = [f'ADD COLUMN "{columns[b]}" {definitions[b]}' for b in TIME_BUCKETS if columns[b] not in existing]
+    if adds:
+        logger.info("Adding time buckets to %s : %s",table_name,list(columns.values()))
+        conn.execute(text(f'ALTER TABLE "{table_name}" {", ".join(adds)}'))
+    bucket_list = ", ".join(f'"{columns[b]}"' for b in TIME_BUCKETS)
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{date_col}" ON "{table_name}" ("{date_col}")'))
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_{date_col}_buckets" ON "{table_name}" ({bucket_list})'))
+    return columns
+
+#Load an existing dataset table (and its lookup table if any)
+def load_table(bind: Union[Engine,Connection],table_name:str) -> Table:
+    md = MetaData()
+    table = Table(table_name,md,autoload_with=bind)
+    if inspect(bind).has_table(dictionary_table_name(table_name)):
+        Table(dictionary_table_name(table_name),md,autoload_with=bind)
+    return table
+
+#Check that a new batch fits the stored column types before appending it
+def validate_append_schema(columns_meta:List[dict],df: pd.DataFrame,schema:dict):
+    stored = {c["name"]:c["type"] for c in columns_meta}
+    missing = set(stored) - set(schema)
+    extra = set(schema) - set(stored)
+    if missing or extra:
+        raise ValueError(f"Columns do not match the dataset (missing: {sorted(missing)}, unexpected: {sorted(extra)}).")
+    for col,ctype in schema.items():
+        # string columns take anything and all-null columns carry no type
+        if stored[col] == "string" or ctype == stored[col] or df[col].dropna().empty:
+            continue
+        raise ValueError(f"Column '{col}' is '{ctype}' but the dataset stores '{stored[col]}'.")
+
+#Insert the dictionaries into the lookup table, offsets skip the codes already stored
+def insert_dictionaries(bind: Union[Engine,Connection],table: Table,dictionaries:Dict[str,List[str]],offsets:Optional[Dict[str,int]] = None):
+    offsets = offsets or {}
+    records = [
+        {"column_name":col,"code":code,"value":dictionary[code]}
+        for col,dictionary in dictionaries.items()
+        for code in range(offsets.get(col,0),len(dictionary))
+    ]
+    if not records:
+        return
+    dict_table = table.metadata.tables[dictionary_table_name(table.name)]
+    statement = dict_table.insert()
+    if bind.dialect.name == "postgresql":
+        # rows left behind by a batch whose COPY failed get the codes reassigned by the retry
+        statement = pg_insert(dict_table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[dict_table.c.column_name,dict_table.c.code],
+            set_={"value":statement.excluded.value}
+        )
+    with _begin(bind) as conn:
+        conn.execute(statement,records)
 
-    df2["__id"] = [uuid.uuid4().hex[:12] for _ in range(len(df2))]
+#Row keys, 12 hex chars each, from one urandom call instead of a uuid per row
+def _row_ids(n:int) -> List[str]:
+    raw = os.urandom(6 * n).hex()
+    return [raw[i:i + 12] for i in range(0,12 * n,12)]
+
+#NULL marker for COPY that no text cell of the frame equals, "\\N" unless the data holds it
+def _copy_null_token(df: pd.DataFrame) -> str:
+    token = "\\N"
+    while True:
+        clash = False
+        for col in df.columns:
+            series = df[col]
+            if isinstance(series.dtype,pd.CategoricalDtype):
+                clash = token in series.cat.categories
+            elif pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype):
+                clash = bool(series.eq(token).any())
+            if clash:
+                break
+        if not clash:
+            return token
+        token = "\\N" + os.urandom(4).hex()
+
+#Insert Into Table
+#On Postgres the frame is streamed through COPY in CSV chunks, straight from the column
+#buffers (categoricals, datetime64, nullable ints) without building per-row dicts
+def insert_data(bind: Union[Engine,Connection], table: Table, df: pd.DataFrame,batch_size:int = 50000):
+    logger.info("Inserting %d rows into %s",len(df),table.name)
+    ids = _row_ids(len(df))
+    with _begin(bind) as conn:
+        if conn.dialect.name != "postgresql":
+            _insert_records(conn,table,df,ids,batch_size)
+            return
 
-    records = df2.to_dict(orient="records")
+        columns = ", ".join(f'"{c}"' for c in [*df.columns,"__id"])
+        null_token = _copy_null_token(df)
+        copy_sql = f'COPY "{table.name}" ({columns}) FROM STDIN WITH (FORMAT csv, NULL \'{null_token}\')'
+        # DBAPI cursor of the same connection, so the COPY is part of its transaction
+        cursor = conn.connection.cursor()
+        for i in range(0,len(df),batch_size):
+            chunk = df.iloc[i:i+batch_size]
+            buf = io.StringIO()
+            chunk.assign(__id=ids[i:i+batch_size]).to_csv(
+                buf,header=False,index=False,na_rep=null_token,date_format="%Y-%m-%d"
+            )
+            buf.seek(0)
+            cursor.copy_expert(copy_sql,buf)
 
-    with engine.begin() as conn:
-        for i in range(0,len(records),batch_size):
-            conn.execute(table.insert(),records[i:i+batch_size])
+#Fallback for other dialects, plain executemany batches
+def _insert_records(conn: Connection, table: Table, df: pd.DataFrame,ids:List[str],batch_size:int):
+    for i in range(0,len(df),batch_size):
+        chunk = df.iloc[i:i+batch_size].astype(object)
+        chunk = chunk.where(chunk.notna(),None).assign(__id=ids[i:i+batch_size])
+        conn.execute(table.insert(),chunk.to_dict(orient="records"))
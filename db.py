@@ -1,8 +1,24 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from config import settings
 
-engine = create_engine(str(settings.DATABASE_URL),echo = (not settings.PRODUCTION))
+engine = create_engine(str(settings.DATABASE_URL),echo = settings.SQL_ECHO)
 
 def get_db_session():
-    return sessionmaker(bind=engine)()
\ No newline at end of file
+    return sessionmaker(bind=engine)()
+
+#Read a query through a server-side cursor, fetch_size rows at a time, stop after max_rows
+def stream_rows(db, query:str, params:dict = None, fetch_size:int = 1000, max_rows:int = None):
+    result = db.execute(
+        text(query), params or {},
+        execution_options={"stream_results": True, "yield_per": fetch_size}
+    ).mappings()
+    rows = []
+    try:
+        for row in result:
+            if max_rows is not None and len(rows) >= max_rows:
+                break
+            rows.append(dict(row))
+    finally:
+        result.close()
+    return rows
@@ -0,0 +1,290 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from prompt_layout import metadata_version
+
+# -------------------------
+# Rule-based planner for the common question templates
+# ("total revenue by region in 2004", "units sold for Classic Cars in Q2 2005")
+# Returns an Answer-shaped plan and a confidence, anything unclear goes to the LLM planner
+# -------------------------
+
+AGG_WORDS = {
+    "COUNT_DISTINCT": ["number of distinct", "number of unique", "distinct number of", "unique number of", "distinct", "unique"],
+    "SUM": ["total", "sum of", "sum"],
+    "AVG": ["average", "avg", "mean"],
+    "COUNT": ["how many", "number of", "count of", "count"],
+    "MIN": ["minimum", "min"],
+    "MAX": ["maximum", "max"],
+}
+
+MEASURE_WORDS = {
+    "revenue": ["revenue", "sales", "turnover", "sales amount"],
+    "units_sold": ["units sold", "unit sold", "units", "quantity sold", "quantity", "qty"],
+    "avg_selling_price": ["selling price", "unit price", "prices", "price"],
+}
+DEFAULT_AGG = {"revenue": "SUM", "units_sold": "SUM", "avg_selling_price": "AVG"}
+
+DIMENSION_WORDS = {
+    "region": ["regions", "region", "territories", "territory", "markets", "market", "areas", "area"],
+    "item_type": ["item types", "item type", "product lines", "product line", "product categories", "product category",
+                  "categories", "category", "products", "product", "items", "item"],
+    "channel": ["sales channels", "sales channel", "channels", "channel"],
+    "date": ["dates", "date"],
+}
+
+# time buckets, only on datasets with materialized year / quarter / month columns
+PERIOD_WORDS = {"year": ["years", "year"], "quarter": ["quarters", "quarter"], "month": ["months", "month"]}
+PERIOD_ADJECTIVES = {"year": ["yearly", "annual"], "quarter": ["quarterly"], "month": ["monthly"]}
+
+GROUP_WORDS = ["grouped by", "group by", "broken down by", "split by", "for each", "for every", "by", "per", "each", "across"]
+
+STOPWORDS = {
+    "what", "whats", "what's", "is", "are", "was", "were", "the", "a", "an", "of", "for", "in", "on", "at", "during",
+    "from", "to", "and", "with", "show", "me", "give", "list", "get", "find", "tell", "display", "please", "all",
+    "our", "my", "overall", "did", "do", "does", "we", "have", "has", "had", "been", "there", "made", "generated",
+    "earned", "sold", "year", "quarter"
+}
+
+VALUE_ROLES = (("region", "regions"), ("item_type", "item_types"), ("channel", "channels"))
+QUARTER_WORDS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "1st": 1, "2nd": 2, "3rd": 3, "4th": 4}
+QUARTER_BOUNDS = {1: ("01-01", "03-31"), 2: ("04-01", "06-30"), 3: ("07-01", "09-30"), 4: ("10-01", "12-31")}
+
+_YEAR = r"((?:19|20)\d{2})"
+DATE_PATTERNS = [
+    (re.compile(r"(?:between\s+|from\s+)?(\d{4}-\d{2}-\d{2})\s*(?:to|and|until|through|-)\s*(\d{4}-\d{2}-\d{2})"), "range"),
+    (re.compile(rf"\bq([1-4])\s*(?:of\s+)?{_YEAR}\b"), "quarter"),
+    (re.compile(rf"\b{_YEAR}\s*q([1-4])\b"), "year_quarter"),
+    (re.compile(rf"\b(first|second|third|fourth|1st|2nd|3rd|4th)\s+quarter\s+(?:of\s+)?{_YEAR}\b"), "quarter_word"),
+    (re.compile(rf"\b(?:between|from)\s+{_YEAR}\s+(?:and|to)\s+{_YEAR}\b"), "year_range"),
+    (re.compile(rf"\b{_YEAR}\b"), "year"),
+]
+TOP_PATTERN = re.compile(r"\b(top|bottom)\s+(\d{1,4})\b")
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+_MAX_GRAMMARS = 256
+_grammars: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+def _alternation(phrases: List[str]) -> Optional["re.Pattern"]:
+    if not phrases:
+        return None
+    ordered = sorted(set(phrases), key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(re.escape(p) for p in ordered) + r")(?!\w)")
+
+def _plurals(name: str) -> List[str]:
+    if name.endswith("y"):
+        return [name, name[:-1] + "ies"]
+    return [name, name + "s"]
+
+def _build_grammar(table_metadata: Dict[str, Any]) -> Dict[str, Any]:
+    column_mapping = table_metadata.get("column_mapping") or {}
+    distinct_values = table_metadata.get("distinct_values") or {}
+
+    # catalog columns first so role vocabulary wins on collisions
+    phrases: Dict[str, Tuple[str, str]] = {}
+    for column in table_metadata.get("columns") or []:
+        kind = "measure" if column.get("type") == "numeric" else "dimension"
+        for name in {column["name"], column["name"].replace("_", " ")}:
+            for phrase in _plurals(name.lower()):
+                phrases[phrase] = (kind, column["name"])
+    for role, words in MEASURE_WORDS.items():
+        if column_mapping.get(role):
+            phrases.update({w: ("measure", role) for w in words})
+    for role, words in DIMENSION_WORDS.items():
+        if column_mapping.get(role):
+            phrases.update({w: ("dimension", role) for w in words})
+    if table_metadata.get("time_buckets"):
+        for bucket, words in PERIOD_WORDS.items():
+            phrases.update({w: ("dimension", bucket) for w in words})
+        for bucket, words in PERIOD_ADJECTIVES.items():
+            phrases.update({w: ("period", bucket) for w in words})
+
+    values: Dict[str, List[Tuple[str, str]]] = {}
+    for role, key in VALUE_ROLES:
+        if not column_mapping.get(role):
+            continue
+        for value in distinct_values.get(key) or []:
+            if value is not None and str(value).strip():
+                values.setdefault(str(value).lower(), []).append((role, str(value)))
+
+    aggs = {w: func for func, words in AGG_WORDS.items() for w in words}
+    return {
+        "has_date": bool(column_mapping.get("date")),
+        "values": values,
+        "value_re": _alternation(list(values.keys())),
+        "aggs": aggs,
+        "agg_re": _alternation(list(aggs.keys())),
+        "phrases": phrases,
+        "phrase_re": _alternation(list(phrases.keys())),
+        "group_re": _alternation(GROUP_WORDS),
+    }
+
+def _grammar(table_metadata: Dict[str, Any]) -> Dict[str, Any]:
+    version = metadata_version(table_metadata)
+    with _lock:
+        grammar = _grammars.get(version)
+        if grammar is not None:
+            _grammars.move_to_end(version)
+            return grammar
+    grammar = _build_grammar(table_metadata)
+    with _lock:
+        _grammars[version] = grammar
+        while len(_grammars) > _MAX_GRAMMARS:
+            _grammars.popitem(last=False)
+    return grammar
+
+def _date_range(kind: str, groups: Tuple[str, ...]) -> Tuple[str, str]:
+    if kind == "range":
+        return groups[0], groups[1]
+    if kind in ("quarter", "year_quarter", "quarter_word"):
+        if kind == "quarter":
+            quarter, year = int(groups[0]), groups[1]
+        elif kind == "year_quarter":
+            year, quarter = groups[0], int(groups[1])
+        else:
+            quarter, year = QUARTER_WORDS[groups[0]], groups[1]
+        start, end = QUARTER_BOUNDS[quarter]
+        return f"{year}-{start}", f"{year}-{end}"
+    if kind == "year_range":
+        return f"{groups[0]}-01-01", f"{groups[1]}-12-31"
+    return f"{groups[0]}-01-01", f"{groups[0]}-12-31"
+
+def _tokenize(question: str, grammar: Dict[str, Any]) -> List[Tuple]:
+    """
+    Replace every recognised span by a token, in priority order, and keep the
+    leftover words so the confidence can count what was not understood.
+    """
+    text = question.lower()
+    spans: List[Tuple[int, int, Tuple]] = []
+
+    def take(pattern, make):
+        nonlocal text
+        if pattern is None:
+            return
+        for m in list(pattern.finditer(text)):
+            token = make(m)
+            if token is None:
+                continue
+            spans.append((m.start(), m.end(), token))
+            text = text[:m.start()] + " " * (m.end() - m.start()) + text[m.end():]
+
+    for pattern, kind in DATE_PATTERNS:
+        take(pattern, lambda m, kind=kind: ("date", _date_range(kind, m.groups())))
+    take(TOP_PATTERN, lambda m: ("top", "DESC" if m.group(1) == "top" else "ASC", int(m.group(2))))
+    take(grammar["value_re"], lambda m: ("value", grammar["values"][m.group(0)]))
+    take(grammar["agg_re"], lambda m: ("agg", grammar["aggs"][m.group(0)]))
+    take(grammar["phrase_re"], lambda m: grammar["phrases"][m.group(0)])
+    take(grammar["group_re"], lambda m: ("by",))
+
+    for m in WORD_PATTERN.finditer(text):
+        spans.append((m.start(), m.end(), ("word", m.group(0))))
+    return [token for _, _, token in sorted(spans, key=lambda s: s[0])]
+
+def plan_question(question: str, table_metadata: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    Deterministic Answer plan for a question, and a confidence in [0, 1]
+    (the share of content words the grammar explained).
+    """
+    grammar = _grammar(table_metadata)
+    tokens = _tokenize(question, grammar)
+
+    filters: Dict[str, Any] = {"region": None, "item_type": None, "channel": None, "date": None}
+    metrics: List[Tuple[str, str]] = []
+    group_by: List[str] = []
+    order_metric: Optional[Tuple[str, str]] = None
+    top: Optional[Tuple[str, int]] = None
+    pending_agg: Optional[str] = None
+    expect_group = False
+    # a "by" that is never followed by something to group on
+    group_open = False
+    content = 0
+    unexplained = 0
+
+    for token in tokens:
+        kind = token[0]
+        if kind == "word" and token[1] in STOPWORDS:
+            continue
+        if kind == "dimension" and token[1] in PERIOD_WORDS and not expect_group:
+            # "in the year 2004", a time word not after "by" is filler as before
+            continue
+        content += 1
+        if group_open and kind not in ("dimension", "measure"):
+            unexplained += 1
+        group_open = False
+
+        if kind == "date":
+            if filters["date"] is not None or not grammar["has_date"]:
+                return None, 0.0
+            filters["date"] = list(token[1])
+            expect_group = False
+        elif kind == "top":
+            if top is not None:
+                return None, 0.0
+            top = (token[1], token[2])
+            expect_group = True
+        elif kind == "value":
+            if len(token[1]) > 1:
+                # same text is a value of two roles
+                return None, 0.0
+            role, value = token[1][0]
+            filters[role] = (filters[role] or []) + [value]
+            expect_group = False
+        elif kind == "agg":
+            if pending_agg is not None:
+                unexplained += 1
+            pending_agg = token[1]
+            expect_group = False
+        elif kind == "by":
+            expect_group = True
+            group_open = True
+        elif kind == "period":
+            # "monthly revenue"
+            if token[1] not in group_by:
+                group_by.append(token[1])
+            expect_group = False
+        elif kind == "measure":
+            metric = (pending_agg or DEFAULT_AGG.get(token[1], "SUM"), token[1])
+            if metric not in metrics:
+                metrics.append(metric)
+            if expect_group and top is not None:
+                # "top 5 countries by sales"
+                order_metric = metric
+            pending_agg = None
+            expect_group = False
+        elif kind == "dimension":
+            if pending_agg in ("COUNT", "COUNT_DISTINCT"):
+                # "how many products per region"
+                metrics.append(("COUNT_DISTINCT", token[1]))
+                pending_agg = None
+            elif expect_group and token[1] not in group_by:
+                group_by.append(token[1])
+            else:
+                unexplained += 1
+        else:
+            unexplained += 1
+            expect_group = False
+
+    if pending_agg is not None or group_open:
+        unexplained += 1
+    if not metrics or (top is not None and not group_by):
+        return None, 0.0
+
+    order_by = []
+    limit = 0
+    if top is not None:
+        func, column = order_metric or metrics[0]
+        order_by.append({"funtion": func, "column_name": column, "order_by": top[0]})
+        limit = top[1]
+
+    plan = {
+        "filters": filters,
+        "extra_filter": [],
+        "metrics": [{func: column} for func, column in metrics],
+        "group_by": group_by,
+        "order_by": order_by,
+        "limit": limit,
+        "notes": [],
+    }
+    return plan, 1.0 - unexplained / max(content, 1)
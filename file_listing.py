@@ -0,0 +1,103 @@
+import base64
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from sqlalchemy import tuple_
+from db import get_db_session
+from model import DatabaseMetadata
+from metrics import record_cache
+
+# -------------------------
+# Keyset-paged dataset listing, cached until an upload or metadata change
+# -------------------------
+
+_MAX_PAGES = 256
+_pages: "OrderedDict[Tuple[Optional[str], int], Dict[str, Any]]" = OrderedDict()
+_version = 0
+_lock = threading.Lock()
+
+def invalidate_file_list():
+    global _version
+    with _lock:
+        _version += 1
+        _pages.clear()
+
+def encode_cursor(created_at: datetime, dataset_id) -> str:
+    raw = json.dumps([created_at.isoformat(), str(dataset_id)])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        created_at, dataset_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), uuid.UUID(dataset_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _fetch_page(cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    db = get_db_session()
+    try:
+        query = db.query(
+            DatabaseMetadata.id,
+            DatabaseMetadata.file_name,
+            DatabaseMetadata.table_name,
+            DatabaseMetadata.created_at,
+            # only the two fields, not the whole metadata document
+            DatabaseMetadata.table_metadata["status"].astext,
+            DatabaseMetadata.table_metadata["stats"]["row_count"].astext,
+        )
+        if cursor is not None:
+            query = query.filter(tuple_(DatabaseMetadata.created_at, DatabaseMetadata.id) < decode_cursor(cursor))
+        rows = (
+            query.order_by(DatabaseMetadata.created_at.desc(), DatabaseMetadata.id.desc())
+            .limit(limit + 1)
+            .all()
+        )
+    finally:
+        db.close()
+
+    items = []
+    for dataset_id, file_name, table_name, created_at, dataset_status, row_count in rows[:limit]:
+        items.append({
+            "file_name": file_name,
+            "table_name": table_name,
+            "status": dataset_status,
+            "row_count": int(row_count) if row_count is not None else None,
+            "created_at": created_at.isoformat() if created_at else None
+        })
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    body = json.dumps(items, separators=(",", ":"))
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "etag": '"' + hashlib.sha1(body.encode("utf-8")).hexdigest() + '"'
+    }
+
+def list_files(cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    """
+    One page of datasets, newest first, with an ETag over its content.
+    """
+    key = (cursor, limit)
+    with _lock:
+        page = _pages.get(key)
+        version = _version
+        if page is not None:
+            _pages.move_to_end(key)
+    record_cache("file_list", hit=page is not None)
+    if page is not None:
+        return page
+
+    page = _fetch_page(cursor, limit)
+    with _lock:
+        # an upload finished while we were reading, do not keep the old page
+        if version == _version:
+            _pages[key] = page
+            while len(_pages) > _MAX_PAGES:
+                _pages.popitem(last=False)
+    return page
@@ -1,9 +1,18 @@
 import re
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional, Tuple
 import pandas as pd
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from model import DatabaseMetadata
+from metrics import stage
+from file_listing import invalidate_file_list
+from dataset_events import publish
+from dataset_store import add_time_buckets, is_internal_column
+from app_logging import get_logger, log_payload
+
+logger = get_logger(__name__)
 
 def _clean_numeric_str(x):
     if isinstance(x, str):
@@ -44,35 +53,92 @@ def infer_col_type(series: pd.Series, sample_size: int = 500) -> str:
     return "string"
 
 
-def profile_df(df: pd.DataFrame, sample_size: int = 500) -> Dict[str, Any]:
-    cols_meta = []
-    for col in df.columns:
-        ctype = infer_col_type(df[col], sample_size=sample_size)
-        meta = {
-            "name": col,
-            "type": ctype,
-            "distinct_count": int(df[col].nunique(dropna=True))
-        }
-
-        if ctype == "numeric":
-            parsed = pd.to_numeric(df[col].map(_clean_numeric_str), errors="coerce").dropna()
-            if len(parsed):
-                meta["min"] = float(parsed.min())
-                meta["max"] = float(parsed.max())
-
-        elif ctype == "date":
-            parsed = pd.to_datetime(df[col], errors="coerce", infer_datetime_format=True).dropna()
-            if len(parsed):
-                meta["min"] = parsed.min().date().isoformat()
-                meta["max"] = parsed.max().date().isoformat()
+# -------------------------
+# Helpers: physical type of numeric columns
+# -------------------------
 
-        else:
-            # small helpful preview
-            vc = df[col].dropna().astype(str).value_counts().head(10)
-            meta["top_values"] = vc.index.tolist()
+INTEGER_STORAGE = (("smallint", 32767), ("integer", 2147483647), ("bigint", 9223372036854775807))
+MONEY_MAX_SCALE = 2
 
-        cols_meta.append(meta)
+def _decimal_scale(value) -> Optional[int]:
+    # digits after the point as written, "1e-05" has 5; None for inf / nan
+    try:
+        exponent = Decimal(str(value)).as_tuple().exponent
+    except InvalidOperation:
+        return None
+    return max(-exponent, 0) if isinstance(exponent, int) else None
 
+def infer_numeric_storage(series: pd.Series) -> Optional[str]:
+    """
+    Tightest Postgres type for a numeric column: smallint / integer / bigint for
+    whole numbers, numeric(18,2) for money-like values with up to two decimals,
+    double precision for other fractions, unbounded numeric when nothing fits.
+    None when the series has no parseable value to judge from.
+    """
+    cleaned = series.dropna().map(_clean_numeric_str)
+    parsed = pd.to_numeric(cleaned, errors="coerce").dropna()
+    if parsed.empty:
+        return None
+
+    bound = max(abs(float(parsed.min())), abs(float(parsed.max())))
+    if bool((parsed % 1 == 0).all()):
+        for name, limit in INTEGER_STORAGE:
+            if bound <= limit:
+                return name
+        return "numeric"
+
+    scales = cleaned.loc[parsed.index].map(_decimal_scale)
+    if scales.isna().any():
+        return "double precision"
+    # always two decimals, so later batches with cents still fit
+    if int(scales.max()) <= MONEY_MAX_SCALE and len(str(int(bound))) <= 18 - MONEY_MAX_SCALE:
+        return f"numeric(18,{MONEY_MAX_SCALE})"
+    return "double precision"
+
+def coerce_numeric(series: pd.Series, storage: str) -> pd.Series:
+    # parse "$1,234" style values once, whole-number types get a nullable Int64 column
+    parsed = pd.to_numeric(series.map(_clean_numeric_str), errors="coerce")
+    if storage in ("smallint", "integer", "bigint"):
+        return parsed.round().astype("Int64")
+    return parsed
+
+def unparsed_count(series: pd.Series, coerced: pd.Series) -> int:
+    # cells that held something coerce_numeric could not parse, they are stored as NULL
+    return int((series.notna() & coerced.isna()).sum())
+
+def profile_column(df: pd.DataFrame, col: str, sample_size: int = 500) -> Dict[str, Any]:
+    ctype = infer_col_type(df[col], sample_size=sample_size)
+    meta = {
+        "name": col,
+        "type": ctype,
+        "distinct_count": int(df[col].nunique(dropna=True))
+    }
+
+    if ctype == "numeric":
+        parsed = pd.to_numeric(df[col].map(_clean_numeric_str), errors="coerce").dropna()
+        if len(parsed):
+            meta["min"] = float(parsed.min())
+            meta["max"] = float(parsed.max())
+
+    elif ctype == "date":
+        parsed = pd.to_datetime(df[col], errors="coerce").dropna()
+        if len(parsed):
+            meta["min"] = parsed.min().date().isoformat()
+            meta["max"] = parsed.max().date().isoformat()
+
+    else:
+        # small helpful preview
+        vc = df[col].dropna().astype(str).value_counts().head(10)
+        meta["top_values"] = vc.index.tolist()
+
+    return meta
+
+def profile_df(df: pd.DataFrame, sample_size: int = 500, max_workers: int = 1) -> Dict[str, Any]:
+    if max_workers <= 1 or len(df.columns) <= 1:
+        return {"columns": [profile_column(df, col, sample_size) for col in df.columns]}
+    # columns are independent, pandas releases the GIL in most of the per-column work
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        cols_meta = list(pool.map(lambda col: profile_column(df, col, sample_size), df.columns))
     return {"columns": cols_meta}
 
 
@@ -137,11 +203,18 @@ def infer_column_mapping(columns: List[str], type_lookup: Dict[str, str]) -> Dic
 # DB helpers
 # -------------------------
 
-def fetch_sample_df(db: Session, table_name: str, limit: int = 2000) -> pd.DataFrame:
+def fetch_sample_df(db: Session, table_name: str, limit: int = 2000, dictionaries: Optional[Dict[str, List[str]]] = None) -> pd.DataFrame:
     # Pull small sample for profiling
     q = text(f'SELECT * FROM "{table_name}" LIMIT :limit')
     rows = db.execute(q, {"limit": limit}).mappings().all()
-    return pd.DataFrame(rows)
+    df = pd.DataFrame(rows)
+    # row key and time buckets are not part of the dataset's columns
+    df = df[[c for c in df.columns if not is_internal_column(c)]]
+    # dictionary encoded columns come back as codes, profile the real values
+    for col, dictionary in (dictionaries or {}).items():
+        if col in df.columns:
+            df[col] = df[col].map(lambda c: dictionary[int(c)] if pd.notna(c) else None)
+    return df
 
 def fetch_row_count(db: Session, table_name: str) -> int:
     q = text(f'SELECT COUNT(*) AS cnt FROM "{table_name}"')
@@ -170,23 +243,122 @@ def fetch_min_max_date(db: Session, table_name: str, date_col: str) -> Tuple[Opt
     return min_d, max_d
 
 
+# -------------------------
+# Incremental update (append)
+# -------------------------
+
+def _merge_min_max(old_min, old_max, new_min, new_max):
+    mins = [v for v in (old_min, new_min) if v is not None]
+    maxs = [v for v in (old_max, new_max) if v is not None]
+    return (min(mins) if mins else None), (max(maxs) if maxs else None)
+
+def merge_batch_metadata(meta: Dict[str, Any], df: pd.DataFrame, file_name: str, distinct_limit: int = 2000) -> Dict[str, Any]:
+    """
+    Fold a newly appended batch into existing table_metadata.
+    Only the batch is looked at, the rows already stored are never rescanned.
+    """
+    meta = dict(meta)
+    column_mapping = meta.get("column_mapping") or {}
+
+    # 1) stats
+    stats = dict(meta.get("stats") or {})
+    stats["row_count"] = int(stats.get("row_count") or 0) + len(df)
+    date_col = column_mapping.get("date")
+    if date_col and date_col in df.columns:
+        parsed = pd.to_datetime(df[date_col], errors="coerce").dropna()
+        if len(parsed):
+            stats["min_date"], stats["max_date"] = _merge_min_max(
+                stats.get("min_date"), stats.get("max_date"),
+                parsed.min().date().isoformat(), parsed.max().date().isoformat()
+            )
+    meta["stats"] = stats
+
+    # 2) distinct values for core dims
+    distinct_values = {k: list(v) for k, v in (meta.get("distinct_values") or {}).items()}
+    for role, key in (("region", "regions"), ("item_type", "item_types"), ("channel", "channels")):
+        col = column_mapping.get(role)
+        if not col or col not in df.columns:
+            continue
+        values = distinct_values.setdefault(key, [])
+        seen = set(values)
+        for v in df[col].dropna().astype(str).unique().tolist():
+            if v not in seen and len(values) < distinct_limit:
+                values.append(v)
+                seen.add(v)
+    meta["distinct_values"] = distinct_values
+
+    # 3) per-column ranges, distinct_count becomes a lower bound without rescanning
+    columns = []
+    for c in meta.get("columns") or []:
+        c = dict(c)
+        col = c["name"]
+        if col in df.columns:
+            if c["type"] == "numeric":
+                parsed = pd.to_numeric(df[col].map(_clean_numeric_str), errors="coerce").dropna()
+                if len(parsed):
+                    c["min"], c["max"] = _merge_min_max(c.get("min"), c.get("max"), float(parsed.min()), float(parsed.max()))
+            elif c["type"] == "date":
+                parsed = pd.to_datetime(df[col], errors="coerce").dropna()
+                if len(parsed):
+                    c["min"], c["max"] = _merge_min_max(c.get("min"), c.get("max"), parsed.min().date().isoformat(), parsed.max().date().isoformat())
+            c["distinct_count"] = max(int(c.get("distinct_count") or 0), int(df[col].nunique(dropna=True)))
+        columns.append(c)
+    meta["columns"] = columns
+
+    meta["source_files"] = list(meta.get("source_files") or [meta.get("file_name")]) + [file_name]
+    return meta
+
+
 # -------------------------
 # Main background task
 # -------------------------
 
-def infer_and_store_metadata(db: Session, datasetid,file_name: str, table_name: str) -> Dict[str, Any]:
+def infer_and_store_metadata(db: Session, datasetid,file_name: str, table_name: str,
+                             profile_workers: int = 1, final_attempt: bool = True) -> Dict[str, Any]:
     """
     Run after upload.
     Reads from Postgres and updates metadata_table.table_metadata.
     """
+    publish(table_name, "profiling")
+    try:
+        with stage("metadata_profiling"):
+            meta = _infer_and_store_metadata(db, datasetid, file_name, table_name, profile_workers)
+    except Exception as e:
+        # a job that will be retried is not finished yet
+        publish(table_name, "failed" if final_attempt else "retrying", error=str(e))
+        raise
+    if meta.get("status") == "ready":
+        publish(table_name, "ready", row_count=meta["stats"]["row_count"])
+    else:
+        publish(table_name, "failed", error=meta.get("error"))
+    return meta
+
+def _infer_and_store_metadata(db: Session, datasetid,file_name: str, table_name: str, profile_workers: int = 1) -> Dict[str, Any]:
+    result = db.query(DatabaseMetadata).filter(DatabaseMetadata.id == datasetid).first()
+    dictionaries = (result.table_metadata or {}).get("dictionaries") or {}
+    storage = (result.table_metadata or {}).get("storage") or {}
+    unparsed = (result.table_metadata or {}).get("unparsed") or {}
+
     # 1) sample for profiling
-    df_sample = fetch_sample_df(db, table_name, limit=2000)
+    df_sample = fetch_sample_df(db, table_name, limit=2000, dictionaries=dictionaries)
     if df_sample.empty:
-        meta = {"status": "error", "error": "Table is empty."}
+        # stored, so the listing and the query endpoints agree with the failed event
+        meta = {**(result.table_metadata or {}), "status": "error", "error": "Table is empty."}
+        result.table_metadata = meta
+        db.commit()
+        invalidate_file_list()
         return meta
 
     # 2) profile types + per-column info
-    prof = profile_df(df_sample, sample_size=500)
+    prof = profile_df(df_sample, sample_size=500, max_workers=profile_workers)
+    for c in prof["columns"]:
+        if c["name"] in dictionaries:
+            c["encoding"] = "dictionary"
+            c["distinct_count"] = len(dictionaries[c["name"]])
+        if c["name"] in storage:
+            c["storage"] = storage[c["name"]]
+        if c["name"] in unparsed:
+            c["unparsed"] = unparsed[c["name"]]
     type_lookup = build_type_lookup(prof["columns"])
 
     # 3) role mapping (merchandising roles)
@@ -203,14 +375,20 @@ def infer_and_store_metadata(db: Session, datasetid,file_name: str, table_name:
         stats["min_date"] = min_d
         stats["max_date"] = max_d
 
+    # 4b) year / quarter / month columns for time grouping, committed with the metadata below
+    time_buckets = add_time_buckets(db, table_name, date_col) if date_col else None
+
     # 5) distinct values for core dims (if found)
     distinct_values = {"regions": [], "item_types": [], "channels": []}
-    if column_mapping.get("region"):
-        distinct_values["regions"] = fetch_distinct_values(db, table_name, column_mapping["region"])
-    if column_mapping.get("item_type"):
-        distinct_values["item_types"] = fetch_distinct_values(db, table_name, column_mapping["item_type"])
-    if column_mapping.get("channel"):
-        distinct_values["channels"] = fetch_distinct_values(db, table_name, column_mapping["channel"])
+    for role, key in (("region", "regions"), ("item_type", "item_types"), ("channel", "channels")):
+        col = column_mapping.get(role)
+        if not col:
+            continue
+        if col in dictionaries:
+            # the dictionary already is the distinct value set, no scan needed
+            distinct_values[key] = list(dictionaries[col])
+        else:
+            distinct_values[key] = fetch_distinct_values(db, table_name, col)
 
     meta: Dict[str, Any] = {
         "status": "ready",
@@ -220,13 +398,16 @@ def infer_and_store_metadata(db: Session, datasetid,file_name: str, table_name:
         "distinct_values": distinct_values,
         "stats": stats,
         "columns": prof["columns"],
+        "dictionaries": dictionaries,
         "version": 1
     }
-    print("Metadata : ",meta)
-    result = db.query(DatabaseMetadata).filter(DatabaseMetadata.id == datasetid).first()
+    if time_buckets:
+        meta["time_buckets"] = time_buckets
+    log_payload(logger, "Metadata : %s", meta)
     result.table_metadata = meta
     db.add(result)
     db.commit()
     db.refresh(result)
-    print("Data has been added ..!")
+    invalidate_file_list()
+    logger.info("Metadata for %s is ready", table_name)
     return meta
@@ -0,0 +1,129 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List
+from prometheus_client import Counter, Histogram
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from db import get_db_session
+from model import IngestJob
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+JOBS = Counter("capstone_jobs_total", "Finished background jobs", ["kind", "outcome"])
+JOB_SECONDS = Histogram(
+    "capstone_job_seconds", "Background job run time", ["kind"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+JOB_WAIT_SECONDS = Histogram(
+    "capstone_job_wait_seconds", "Time a job waited in the queue before a worker claimed it", ["kind"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+)
+
+# -------------------------
+# Postgres-backed job queue, workers claim rows with FOR UPDATE SKIP LOCKED
+# -------------------------
+
+def enqueue(db: Session, kind: str, payload: Dict[str, Any], max_attempts: int = 3) -> IngestJob:
+    """
+    Add a job to the caller's transaction, it becomes visible when the caller commits
+    (so a dataset row and its profiling job are written together).
+    """
+    job = IngestJob(kind=kind, payload=payload, max_attempts=max_attempts)
+    db.add(job)
+    return job
+
+def has_live_job(db: Session, kind: str, dataset_id) -> bool:
+    # queued or running, i.e. a worker will still finish the dataset
+    return db.query(IngestJob.id).filter(
+        IngestJob.kind == kind,
+        IngestJob.status.in_(("queued", "running")),
+        IngestJob.payload["dataset_id"].astext == str(dataset_id),
+    ).first() is not None
+
+def claim_jobs(worker_id: str, limit: int) -> List[Dict[str, Any]]:
+    db = get_db_session()
+    try:
+        jobs = (
+            db.query(IngestJob)
+            .filter(IngestJob.status == "queued", IngestJob.run_after <= func.now())
+            .order_by(IngestJob.run_after)
+            .with_for_update(skip_locked=True)
+            .limit(limit)
+            .all()
+        )
+        now = datetime.now(timezone.utc)
+        claimed = []
+        for job in jobs:
+            job.status = "running"
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.attempts += 1
+            if job.created_at:
+                JOB_WAIT_SECONDS.labels(kind=job.kind).observe(max((now - job.created_at).total_seconds(), 0))
+            claimed.append({
+                "id": job.id,
+                "kind": job.kind,
+                "payload": dict(job.payload),
+                "attempts": job.attempts,
+                "max_attempts": job.max_attempts
+            })
+        db.commit()
+        return claimed
+    finally:
+        db.close()
+
+def complete_job(job: Dict[str, Any], seconds: float):
+    db = get_db_session()
+    try:
+        db.query(IngestJob).filter(IngestJob.id == job["id"]).update(
+            {"status": "done", "finished_at": func.now(), "last_error": None}
+        )
+        db.commit()
+    finally:
+        db.close()
+    JOBS.labels(kind=job["kind"], outcome="done").inc()
+    JOB_SECONDS.labels(kind=job["kind"]).observe(seconds)
+
+def fail_job(job: Dict[str, Any], error: str, seconds: float) -> bool:
+    """
+    Requeue with jittered backoff while attempts remain. Returns True when the job will run again.
+    """
+    retry = job["attempts"] < job["max_attempts"]
+    values: Dict[str, Any] = {"last_error": error[:2000], "locked_by": None}
+    if retry:
+        backoff = random.uniform(0, min(300.0, 5.0 * 2 ** job["attempts"]))
+        values.update(status="queued", run_after=datetime.now(timezone.utc) + timedelta(seconds=backoff))
+    else:
+        values.update(status="failed", finished_at=func.now())
+
+    db = get_db_session()
+    try:
+        db.query(IngestJob).filter(IngestJob.id == job["id"]).update(values)
+        db.commit()
+    finally:
+        db.close()
+    JOBS.labels(kind=job["kind"], outcome="retried" if retry else "failed").inc()
+    JOB_SECONDS.labels(kind=job["kind"]).observe(seconds)
+    return retry
+
+def requeue_stale(stale_seconds: float) -> int:
+    # a worker that died mid-job leaves it running, hand it to the next worker
+    db = get_db_session()
+    try:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=stale_seconds)
+        stale = db.query(IngestJob).filter(IngestJob.status == "running", IngestJob.locked_at < cutoff)
+        stale.filter(IngestJob.attempts >= IngestJob.max_attempts).update(
+            {"status": "failed", "finished_at": func.now(), "last_error": "Worker lost while running the job"},
+            synchronize_session=False
+        )
+        count = stale.filter(IngestJob.attempts < IngestJob.max_attempts).update(
+            {"status": "queued", "locked_by": None, "run_after": func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+    if count:
+        logger.warning("Requeued %d stale jobs", count)
+    return count
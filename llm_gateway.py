@@ -0,0 +1,138 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, Optional
+from prometheus_client import Gauge, Histogram, Counter
+from config import settings
+from metrics import record_cache
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# only failures that can go away on their own are retried, auth / bad request / parser errors are not
+try:
+    import openai
+    TRANSIENT_ERRORS = (TimeoutError, openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+except ImportError:
+    TRANSIENT_ERRORS = (TimeoutError,)
+
+LLM_QUEUE_WAITING = Gauge("capstone_llm_queue_waiting", "LLM calls waiting for a concurrency slot")
+LLM_QUEUE_SECONDS = Histogram(
+    "capstone_llm_queue_seconds", "Time spent waiting for a concurrency slot", ["stage"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30)
+)
+LLM_RETRIES = Counter("capstone_llm_retries_total", "LLM call retries", ["stage"])
+LLM_TIMEOUTS = Counter("capstone_llm_timeouts_total", "LLM calls that hit the stage timeout", ["stage"])
+
+class CallTimeout(TimeoutError):
+    """The upstream call outlived the stage timeout, `future` is the call still running."""
+    def __init__(self, message: str, future: Future):
+        super().__init__(message)
+        self.future = future
+
+
+class LLMGateway:
+    """
+    One place every LLM call goes through:
+    - chains are built once per name and reused
+    - at most `max_concurrency` upstream calls, the rest queue
+    - per-stage timeout, retries of transient failures with full jitter while the retry budget lasts
+    - identical in-flight calls (same stage + inputs) share one upstream call
+    """
+    def __init__(self, max_concurrency: int, timeouts: Dict[str, float], max_retries: int, retry_budget: float):
+        self.timeouts = timeouts
+        self.max_retries = max_retries
+        self.retry_budget = retry_budget
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._chains: Dict[Any, Any] = {}
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def chain(self, name: str, llm, build: Callable[[Any], Any]):
+        # keyed on the client too, so swapping the llm (tests, benchmarks) rebuilds
+        key = (name, id(llm))
+        chain = self._chains.get(key)
+        if chain is None:
+            chain = build(llm)
+            self._chains[key] = chain
+        return chain
+
+    def invoke(self, stage_name: str, chain, inputs: Dict[str, Any], config: Optional[Dict[str, Any]] = None):
+        key = stage_name + ":" + json.dumps(inputs, sort_keys=True, default=str)
+        with self._lock:
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        record_cache("llm_single_flight", hit=not leader)
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(self._invoke_with_retries(stage_name, chain, inputs, config))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+        return future.result()
+
+    def _invoke_with_retries(self, stage_name: str, chain, inputs, config):
+        start = time.monotonic()
+        attempt = 0
+        pending: Optional[Future] = None
+        while True:
+            try:
+                return self._invoke_once(stage_name, chain, inputs, config, pending)
+            except TRANSIENT_ERRORS as e:
+                attempt += 1
+                # a timed-out call keeps running, the retry waits on it instead of starting a second one
+                pending = e.future if isinstance(e, CallTimeout) else None
+                backoff = 0.0 if pending is not None else random.uniform(0, min(8.0, 0.5 * 2 ** attempt))
+                if attempt > self.max_retries or time.monotonic() - start + backoff > self.retry_budget:
+                    raise
+                LLM_RETRIES.labels(stage=stage_name).inc()
+                logger.warning("%s failed (%s), retry %d in %.2fs", stage_name, e, attempt, backoff)
+                time.sleep(backoff)
+
+    def _invoke_once(self, stage_name: str, chain, inputs, config, pending: Optional[Future] = None):
+        timeout = self.timeouts.get(stage_name)
+        if pending is not None:
+            return self._wait(stage_name, pending, timeout)
+        queued = time.monotonic()
+        LLM_QUEUE_WAITING.inc()
+        try:
+            acquired = self._slots.acquire(timeout=timeout)
+        finally:
+            LLM_QUEUE_WAITING.dec()
+        LLM_QUEUE_SECONDS.labels(stage=stage_name).observe(time.monotonic() - queued)
+        if not acquired:
+            LLM_TIMEOUTS.labels(stage=stage_name).inc()
+            raise TimeoutError(f"{stage_name} waited {timeout}s for an LLM slot")
+
+        # the slot stays taken until the upstream call really ends, even after a timeout
+        future = self._pool.submit(chain.invoke, inputs, config)
+        future.add_done_callback(lambda _: self._slots.release())
+        return self._wait(stage_name, future, timeout)
+
+    def _wait(self, stage_name: str, future: Future, timeout: Optional[float]):
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.done():
+                # finished right at the deadline, or the call itself raised a TimeoutError
+                return future.result()
+            LLM_TIMEOUTS.labels(stage=stage_name).inc()
+            raise CallTimeout(f"{stage_name} took longer than {timeout}s", future)
+
+
+gateway = LLMGateway(
+    max_concurrency=settings.LLM_MAX_CONCURRENCY,
+    timeouts=settings.LLM_TIMEOUT_SECONDS,
+    max_retries=settings.LLM_MAX_RETRIES,
+    retry_budget=settings.LLM_RETRY_BUDGET_SECONDS
+)
@@ -0,0 +1,141 @@
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+
+# -------------------------
+# Template narrative for small results, same output format as the summarizer prompt:
+# short answer, bullet list of filters and metrics, optional notes
+# -------------------------
+
+AGG_LABELS = {
+    "SUM": "total",
+    "AVG": "average",
+    "COUNT": "count of",
+    "COUNT_DISTINCT": "number of distinct",
+    "MIN": "minimum",
+    "MAX": "maximum",
+}
+MEASURE_LABELS = {"avg_selling_price": "selling price", "units_sold": "units sold"}
+FILTER_LABELS = {"region": "Region", "item_type": "Item type", "channel": "Channel"}
+
+def _metric_key(func: str) -> str:
+    # output name Postgres gives an unaliased aggregate
+    return "count" if func == "COUNT_DISTINCT" else func.lower()
+
+def _metrics(answer: Dict[str, Any]) -> List[tuple]:
+    metrics = []
+    for item in answer["metrics"]:
+        for func, column in item.items():
+            func = getattr(func, "value", func)
+            metrics.append((func, column))
+    return metrics
+
+def _label(func: str, column: str) -> str:
+    return f"{AGG_LABELS.get(func, func.lower())} {MEASURE_LABELS.get(column, column.replace('_', ' '))}"
+
+def _number(value) -> str:
+    if value is None:
+        return "n/a"
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        value = float(value)
+        if value.is_integer():
+            return f"{int(value):,}"
+        return f"{value:,.2f}"
+    return str(value)
+
+def _value(row: Dict[str, Any], key: str) -> str:
+    # sampled estimates carry <key>_margin, the confidence half-width
+    text = _number(row.get(key))
+    margin = row.get(f"{key}_margin")
+    if margin is not None and row.get(key) is not None:
+        text += f" (±{_number(margin)})"
+    return text
+
+def _join(items: List[str]) -> str:
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+def is_simple(answer: Dict[str, Any], rows: List[Dict[str, Any]], max_rows: int = 10, max_metrics: int = 3) -> bool:
+    """
+    Small enough to describe with the template: few rows, few metrics and
+    one result column per metric (two SUMs share the name "sum").
+    """
+    metrics = _metrics(answer)
+    keys = [_metric_key(func) for func, _ in metrics]
+    return 0 < len(metrics) <= max_metrics and len(set(keys)) == len(keys) and len(rows) <= max_rows
+
+def render_summary(answer: Dict[str, Any], rows: List[Dict[str, Any]], group_columns: List[str], truncated: bool = False,
+                   approximate: Optional[Dict[str, Any]] = None) -> str:
+    metrics = _metrics(answer)
+    filters = answer.get("filters") or {}
+    date = filters.get("date")
+    period = f" between {date[0]} and {date[1]}" if date else ""
+
+    # short answer
+    values_found = any(row.get(_metric_key(func)) is not None for row in rows for func, _ in metrics)
+    if not rows or not values_found:
+        sentences = ["No matching data was found for this question."]
+    elif not group_columns:
+        row = rows[0]
+        parts = [f"{_label(func, column)} was {'about ' if approximate else ''}{_value(row, _metric_key(func))}" for func, column in metrics]
+        text = _join(parts)
+        sentences = [text[0].upper() + text[1:] + period + "."]
+    else:
+        def key_of(row):
+            return " / ".join(str(row.get(c)) for c in group_columns)
+        group_label = " and ".join(g.replace("_", " ") for g in answer.get("group_by") or group_columns)
+        sentences = [f"The result has {len(rows)} {group_label} group{'s' if len(rows) != 1 else ''}{period}."]
+        for func, column in metrics[:2]:
+            key = _metric_key(func)
+            label = _label(func, column)
+            if len(rows) <= 3:
+                listed = _join([f"{_value(row, key)} for {key_of(row)}" for row in rows])
+                sentences.append(f"{label[0].upper() + label[1:]} was {listed}.")
+            else:
+                valued = [row for row in rows if row.get(key) is not None]
+                if not valued:
+                    sentences.append(f"{label[0].upper() + label[1:]} has no values in these groups.")
+                    continue
+                high = max(valued, key=lambda r: r[key])
+                low = min(valued, key=lambda r: r[key])
+                sentences.append(
+                    f"{label[0].upper() + label[1:]} ranges from {_value(low, key)} ({key_of(low)}) "
+                    f"to {_value(high, key)} ({key_of(high)})."
+                )
+
+    # applied filters and metrics
+    bullets = []
+    for role, label in FILTER_LABELS.items():
+        if filters.get(role):
+            bullets.append(f"- {label}: {', '.join(str(v) for v in filters[role])}")
+    if date:
+        bullets.append(f"- Date range: {date[0]} to {date[1]}")
+    for item in answer.get("extra_filter") or []:
+        op = getattr(item.get("op"), "value", item.get("op"))
+        value = "" if item.get("value") is None else f" {item['value']}"
+        bullets.append(f"- {item.get('column')} {op}{value}")
+    if not bullets:
+        bullets.append("- Filters: none, all data was used")
+    bullets.append(f"- Metrics: {', '.join(_label(func, column) for func, column in metrics)}")
+    if answer.get("group_by"):
+        bullets.append(f"- Grouped by: {', '.join(g.replace('_', ' ') for g in answer['group_by'])}")
+    if truncated:
+        bullets.append(f"- Only the first {len(rows)} rows were used")
+    if approximate:
+        bullets.append(
+            f"- Approximate: estimated from a {approximate['sample_percent']:g}% random sample, "
+            f"± values are {approximate['confidence']:.0%} confidence margins"
+        )
+
+    lines = sentences[:3] + [""] + bullets
+    notes = answer.get("notes") or []
+    if notes:
+        lines += ["", "Notes:"] + [f"- {note}" for note in notes]
+    return "\n".join(lines)
+
+def summarize_locally(answer: Dict[str, Any], rows: List[Dict[str, Any]], group_columns: List[str],
+                      truncated: bool = False, max_rows: int = 10, max_metrics: int = 3,
+                      approximate: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    if not is_simple(answer, rows, max_rows=max_rows, max_metrics=max_metrics):
+        return None
+    return render_summary(answer, rows, group_columns, truncated, approximate)
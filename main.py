@@ -1,25 +1,50 @@
 from fastapi import FastAPI
-from fastapi import UploadFile,File,Form,BackgroundTasks,status
-from fastapi.responses import JSONResponse,FileResponse
+from fastapi import UploadFile,File,Form,BackgroundTasks,status,Header
+from fastapi import Query as QueryParam
+from fastapi.responses import JSONResponse,Response,StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Annotated
-import pandas as pd
+from typing import Annotated,List,TYPE_CHECKING
+from contextlib import asynccontextmanager
 import io
-from dataset_store import normalize_columns,make_table_name,create_table_from_df,insert_data
 from db import engine,get_db_session
-from charset_normalizer import from_bytes
 from model import DatabaseMetadata
 import uuid
-from infer_metadata import infer_and_store_metadata,infer_col_type
-import numpy as np
-from ai import orchestrator
-from braintrust.wrappers.openai import BraintrustTracingProcessor
-from braintrust import init_logger,load_prompt
-from agents import set_default_openai_key,set_trace_processors
-from fastapi.staticfiles import StaticFiles
+from result_store import fetch_page
+from admission import QueryRejected
+from file_listing import list_files,invalidate_file_list
+from dataset_events import bus,event_stream,publish,start_listener
+from job_queue import enqueue,has_live_job
+from fastapi.encoders import jsonable_encoder
+from metrics import stage,record_rows,record_cache,render_metrics
+from app_logging import get_logger,log_payload
+from startup import start_warm_up,timed_import,ai_ready,import_report
+from static_files import PrecompressedStaticFiles,IndexPage
+from config import settings
 import os
+import threading
+import hashlib
 
-app = FastAPI()
+# pandas / numpy / charset_normalizer / dataset_store / infer_metadata / ai are
+# imported inside the handlers (or by the warm-up thread) to keep cold start fast
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = get_logger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WARMUP_ON_STARTUP:
+        start_warm_up()
+    stop = threading.Event()
+    if settings.JOB_QUEUE_ENABLED:
+        start_listener(stop)
+        if settings.EMBEDDED_WORKER:
+            from worker import start_embedded_worker
+            start_embedded_worker(stop)
+    yield
+    stop.set()
+
+app = FastAPI(lifespan=lifespan)
 
 @app.get("/")
 
@@ -33,6 +58,109 @@ async def home_page():
 # ******************************************************
 class GetFile(BaseModel):
     file: UploadFile = Field(...)
+    dictionary_encode: bool = Field(False)
+    table_name: str | None = Field(None)
+
+#Most recent dataset loaded from the same content that is ready, or still being profiled by a live job
+def find_duplicate_upload(content_hash:str):
+    db = get_db_session()
+    try:
+        rows = (
+            db.query(DatabaseMetadata.id,DatabaseMetadata.file_name,DatabaseMetadata.table_name,DatabaseMetadata.table_metadata)
+            .filter(DatabaseMetadata.content_hash == content_hash)
+            .order_by(DatabaseMetadata.created_at.desc())
+            .limit(5)
+            .all()
+        )
+        for row in rows:
+            dataset_status = (row.table_metadata or {}).get("status")
+            if dataset_status == "ready":
+                return row
+            #a "processing" dataset without a queued / running job will never finish, load the file again
+            if dataset_status == "processing" and settings.JOB_QUEUE_ENABLED and has_live_job(db,"profile_dataset",row.id):
+                return row
+        return None
+    finally:
+        db.close()
+
+#Append a new batch into an existing dataset and fold it into the metadata
+def append_file(df: "pd.DataFrame",file_name:str,table_name:str):
+    pd = timed_import("pandas")
+    from dataset_store import load_table,validate_append_schema,extend_dictionary_columns,compact_string_columns,insert_dictionaries,insert_data,widen_storage,alter_column_types
+    from infer_metadata import infer_col_type,merge_batch_metadata,infer_numeric_storage,coerce_numeric,unparsed_count
+
+    db = get_db_session()
+    try:
+        result = (
+            db.query(DatabaseMetadata)
+            .filter(DatabaseMetadata.table_name == table_name)
+            .with_for_update()
+            .first()
+        )
+        if result is None:
+            raise ValueError(f"Dataset '{table_name}' does not exist.")
+        meta = result.table_metadata
+        if meta.get("status") != "ready":
+            raise ValueError("Data processing still in progress please wait for sometime..!")
+
+        with stage("type_inference"):
+            schema = {col:infer_col_type(df[col], sample_size=1000) for col in df.columns}
+        validate_append_schema(meta["columns"],df,schema)
+
+        #parse with the stored types, not the batch ones
+        stored = {c["name"]:c["type"] for c in meta["columns"]}
+        for col in df.columns:
+            if stored[col] == 'date':
+                df[col] = pd.to_datetime(df[col], errors="coerce")
+
+        #narrowed numeric columns are widened when the batch does not fit them
+        widened = {}
+        for c in meta["columns"]:
+            if c["type"] != "numeric" or not c.get("storage"):
+                continue
+            target = widen_storage(c["storage"],infer_numeric_storage(df[c["name"]]))
+            if target != c["storage"]:
+                widened[c["name"]] = target
+                c["storage"] = target
+            coerced = coerce_numeric(df[c["name"]],target)
+            unparsed = unparsed_count(df[c["name"]],coerced)
+            if unparsed:
+                #kept as NULL, counted so the loss is visible in the metadata
+                logger.warning("%d values of %s in %s are not numeric and were stored as NULL",unparsed,c["name"],table_name)
+                c["unparsed"] = int(c.get("unparsed") or 0) + unparsed
+            df[c["name"]] = coerced
+
+        with stage("metadata_profiling"):
+            meta = merge_batch_metadata(meta,df,file_name)
+
+        dictionaries = {k:list(v) for k,v in (meta.get("dictionaries") or {}).items()}
+        offsets = extend_dictionary_columns(df,dictionaries)
+        for c in meta["columns"]:
+            if c["name"] in dictionaries:
+                c["distinct_count"] = len(dictionaries[c["name"]])
+        meta["dictionaries"] = dictionaries
+        compact_string_columns(df,stored,skip=list(dictionaries))
+
+        with stage("bulk_insert"):
+            #on the session's connection: rows, dictionaries, types and metadata commit together
+            conn = db.connection()
+            alter_column_types(bind=conn,table_name=table_name,storage=widened)
+            table = load_table(bind=conn,table_name=table_name)
+            insert_dictionaries(bind=conn,table=table,dictionaries=dictionaries,offsets=offsets)
+            insert_data(bind=conn,table=table,df=df[list(stored.keys())],batch_size=settings.INSERT_BATCH_ROWS)
+        record_rows("bulk_insert","inserted",len(df))
+
+        result.table_metadata = meta
+        # the table no longer holds exactly the originally uploaded file
+        result.content_hash = None
+        db.add(result)
+        db.commit()
+        invalidate_file_list()
+        publish(table_name,"ready",row_count=meta["stats"]["row_count"],appended=len(df))
+        logger.info("Appended %d rows into %s",len(df),table_name)
+        return meta
+    finally:
+        db.close()
 
 @app.post("/api/upload")
 async def upload_file(
@@ -42,59 +170,152 @@ async def upload_file(
     ):
     try:
         if not payload.file.filename.lower().endswith(".csv"):
-            print("Invalid File received : ",payload.file.filename)
+            logger.warning("Invalid File received : %s",payload.file.filename)
             return JSONResponse(
                 content=({"error":"Only .csv file supported please provide the correct format"}),
                 status_code= status.HTTP_400_BAD_REQUEST
             )
         
-        content = await payload.file.read()
+        #hash while reading, no second pass over the bytes
+        hasher = hashlib.sha256()
+        chunks = []
+        while chunk := await payload.file.read(1024 * 1024):
+            hasher.update(chunk)
+            chunks.append(chunk)
+        content = b"".join(chunks)
+
+        pd = timed_import("pandas")
+        from_bytes = timed_import("charset_normalizer").from_bytes
+        from dataset_store import NULL_TOKENS,upload_fingerprint,normalize_columns,make_table_name,create_table_from_df,insert_data,detect_dictionary_columns,encode_dictionary_columns,compact_string_columns,insert_dictionaries
+        from infer_metadata import infer_and_store_metadata,infer_col_type,infer_numeric_storage,coerce_numeric,unparsed_count
 
         #detect the encoding apply while reading file
-        detected = from_bytes(content).best()
-        print("Detected encoding:", detected.encoding)
-        print("Confidence:", detected.chaos)  
-        df = pd.read_csv(io.BytesIO(content),encoding=detected.encoding)
+        with stage("encoding_detection"):
+            detected = from_bytes(content).best()
+        logger.info("Detected encoding: %s (chaos %s)", detected.encoding, detected.chaos)
+
+        #same bytes, encoding, header and load options as an existing dataset: hand that one back
+        content_hash = None
+        if settings.UPLOAD_DEDUP_ENABLED and not payload.table_name:
+            header = pd.read_csv(io.BytesIO(content),encoding=detected.encoding,nrows=0).columns
+            load_options = {"dictionary_encode":payload.dictionary_encode}
+            if payload.dictionary_encode:
+                load_options["dictionary_max_cardinality"] = settings.DICTIONARY_MAX_CARDINALITY
+            content_hash = upload_fingerprint(hasher.hexdigest(),detected.encoding,[normalize_columns(c) for c in header],load_options)
+            duplicate = find_duplicate_upload(content_hash)
+            record_cache("upload_dedup",hit=duplicate is not None)
+            if duplicate is not None:
+                meta = duplicate.table_metadata or {}
+                logger.info("Upload %s matches %s, reusing it",payload.file.filename,duplicate.table_name)
+                return JSONResponse(
+                    content= jsonable_encoder({
+                        "message":"Data is already loaded",
+                        "table_name": duplicate.table_name,
+                        "file_name":  payload.file.filename,
+                        "duplicate": True,
+                        "status": meta.get("status"),
+                        "metadata": meta if meta.get("status") == "ready" else None
+                    }),
+                    status_code=status.HTTP_200_OK
+                )
+
+        with stage("csv_parse"):
+            #null tokens are handled by the parser, no full-frame replace passes afterwards
+            df = pd.read_csv(io.BytesIO(content),encoding=detected.encoding,na_values=NULL_TOKENS)
 
         #read file with above encoding
         df.columns = [normalize_columns(c) for c in df.columns]
         # df = df.where(pd.notna(df), None)
+
+        if payload.table_name:
+            try:
+                meta = append_file(df=df,file_name=payload.file.filename,table_name=payload.table_name)
+            except ValueError as e:
+                logger.warning("Append rejected : %s",e)
+                return JSONResponse(
+                    content=({"error":str(e)}),
+                    status_code= status.HTTP_400_BAD_REQUEST
+                )
+            return JSONResponse(
+                content= {
+                    "message":"Data is appended",
+                    "table_name": payload.table_name,
+                    "file_name":  payload.file.filename,
+                    "row_count": meta["stats"]["row_count"]
+                },
+                status_code=status.HTTP_200_OK
+            )
+
         table_name = make_table_name("sales")
        
         schema = {}
-        for col in df.columns:
-            ctype = infer_col_type(df[col], sample_size=1000)
-            schema[col] = ctype
-            if ctype == 'date':
-                df[col] = pd.to_datetime(df[col], errors="coerce")
-                df[col] = df[col].dt.date
-        print(schema)
+        storage = {}
+        unparsed = {}
+        with stage("type_inference"):
+            for col in df.columns:
+                ctype = infer_col_type(df[col], sample_size=1000)
+                schema[col] = ctype
+                if ctype == 'date':
+                    df[col] = pd.to_datetime(df[col], errors="coerce")
+                elif ctype == 'numeric':
+                    #tightest integer / fixed-scale / double type instead of unbounded numeric
+                    storage[col] = infer_numeric_storage(df[col])
+                    coerced = coerce_numeric(df[col],storage[col])
+                    #a numeric column may still hold a few cells that do not parse, stored as NULL and counted
+                    count = unparsed_count(df[col],coerced)
+                    if count:
+                        unparsed[col] = count
+                    df[col] = coerced
+        log_payload(logger,"Schema : %s, storage : %s",schema,storage)
+        if unparsed:
+            logger.warning("Values stored as NULL because they are not numeric : %s",unparsed)
 
-        table = create_table_from_df(eng=engine,schema=schema,table_name=table_name)
-        
-        df = df.replace({pd.NaT: None, np.nan: None})
-        df = df.replace({"NaT": None, "nat": None, "None": None, "none": None, "nan": None, "NaN": None})
-        insert_data(table=table,engine=engine,df=df,batch_size=1000)
+        #store low-cardinality string columns as smallint codes + lookup table
+        dictionaries = {}
+        dictionary_columns = []
+        if payload.dictionary_encode:
+            dictionary_columns = detect_dictionary_columns(df,schema,max_cardinality=settings.DICTIONARY_MAX_CARDINALITY)
+            dictionaries = encode_dictionary_columns(df,dictionary_columns)
+            logger.info("Dictionary encoded columns : %s",dictionary_columns)
+        compact_string_columns(df,schema,skip=dictionary_columns)
+
+        with stage("bulk_insert"):
+            table = create_table_from_df(eng=engine,schema=schema,table_name=table_name,dictionary_columns=dictionary_columns,storage=storage)
+            insert_dictionaries(bind=engine,table=table,dictionaries=dictionaries)
+            insert_data(bind=engine,table=table,df=df,batch_size=settings.INSERT_BATCH_ROWS)
+        record_rows("bulk_insert","inserted",len(df))
 
         metadata = DatabaseMetadata(
             file_name = payload.file.filename,
             table_name = table_name,
-            table_metadata = {"status":"processing"}
+            content_hash = content_hash,
+            table_metadata = {"status":"processing","dictionaries":dictionaries,"storage":storage,"unparsed":unparsed}
         )
 
         db = get_db_session()
         db.add(metadata)
+        if settings.JOB_QUEUE_ENABLED:
+            #profiling job is committed with the dataset row, a worker picks it up
+            db.flush()
+            enqueue(db,"profile_dataset",{
+                "dataset_id": str(metadata.id),
+                "file_name": payload.file.filename,
+                "table_name": table_name
+            },max_attempts=settings.JOB_MAX_ATTEMPTS)
         db.commit()
         db.refresh(metadata)
+        invalidate_file_list()
+        publish(table_name,"ingested",row_count=len(df))
 
         if db:
             db.close()
-        
-        background_task.add_task(infer_and_store_metadata,get_db_session(),metadata.id, payload.file.filename,table_name)
+
+        if not settings.JOB_QUEUE_ENABLED:
+            background_task.add_task(infer_and_store_metadata,get_db_session(),metadata.id, payload.file.filename,table_name)
 
         
     except Exception as e:
-        print(e)
+        logger.exception("Upload failed")
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content= ({"error":"Internal server error"})
@@ -113,36 +334,78 @@ async def upload_file(
 # Upload File
 # ******************************************************
 @app.get('/api/getfiles')
-async def get_files():
+def get_files(
+    cursor: str | None = None,
+    limit: Annotated[int,QueryParam(ge=1,le=100)] = 20,
+    if_none_match: Annotated[str | None,Header()] = None
+    ):
     try:
-        print("Getting Files")
-        db = get_db_session()
-        response = (
-            db.query(DatabaseMetadata.file_name,DatabaseMetadata.table_name)
-            .order_by(DatabaseMetadata.created_at.desc())
-            .limit(20)
-            .all()
+        logger.debug("Getting Files")
+        page = list_files(cursor=cursor,limit=limit)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content=({"error":str(e)})
         )
-        data = []
-        for file_name, table_name in response:
-            temp = {}
-            temp["file_name"] = file_name
-            temp["table_name"] = table_name
-            data.append(temp)
-
-        print(data)
-        return data
     except Exception as e:
-        print(e)
+        logger.exception("Failed to list files")
         return JSONResponse(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             content=({"error":"Internal Server Error"})
         )
-    finally:
-        if db:
-            db.close()
-            print("Session Closed")
 
+    # body stays a plain list, the next page is announced in a header
+    headers = {"ETag":page["etag"],"Cache-Control":"no-cache"}
+    if page["next_cursor"]:
+        headers["X-Next-Cursor"] = page["next_cursor"]
+    if if_none_match and page["etag"] in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED,headers=headers)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content=page["items"],
+        headers=headers
+    )
+
+
+# ******************************************************
+# Dataset readiness (server-sent events)
+# ******************************************************
+@app.get("/api/datasets/{table_name}/events")
+def dataset_events(table_name: str):
+    current = None
+    if bus.last_event(table_name) is None:
+        # nothing published in this process yet, start from the stored state
+        db = get_db_session()
+        try:
+            row = (
+                db.query(
+                    DatabaseMetadata.table_metadata["status"].astext,
+                    DatabaseMetadata.table_metadata["stats"]["row_count"].astext,
+                    DatabaseMetadata.table_metadata["error"].astext,
+                )
+                .filter(DatabaseMetadata.table_name == table_name)
+                .first()
+            )
+        finally:
+            db.close()
+        if row is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content=({"error":"Dataset not found"})
+            )
+        dataset_status,row_count,error = row
+        if dataset_status == "ready":
+            current = {"table_name":table_name,"event":"ready","ts":0,"row_count":int(row_count) if row_count else None}
+        elif dataset_status in ("error","failed"):
+            #terminal, the stream ends right after this event
+            current = {"table_name":table_name,"event":"failed","ts":0,"error":error}
+        else:
+            current = {"table_name":table_name,"event":"profiling","ts":0}
+    return StreamingResponse(
+        event_stream(table_name,current),
+        media_type="text/event-stream",
+        headers={"Cache-Control":"no-cache","X-Accel-Buffering":"no"}
+    )
 
 # ******************************************************
 # Analyse data
@@ -150,19 +413,86 @@ async def get_files():
 class Query(BaseModel):
     query: str = Field(...,min_length=3,max_length=500)
     table_name: str = Field(...)
+    detailed: bool = Field(False)
+    approximate: bool = Field(False)
 
 @app.post("/api/analyse")
 def answer(payload: Annotated[Query,Form()]):
-    print(payload.query)
+    logger.info("Query for %s : %s",payload.table_name,payload.query)
+    from ai import orchestrator
     # result =  query_generator(db=get_db_session(),table_name=payload.table_name,user_query=payload.query)
-    result = orchestrator(table_name=payload.table_name,user_query=payload.query,db= get_db_session())
+    result = orchestrator(table_name=payload.table_name,user_query=payload.query,db= get_db_session(),detailed=payload.detailed,approximate=payload.approximate)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content=(result)
+    )
+
+# ******************************************************
+# Raw results (keyset paginated)
+# ******************************************************
+@app.get("/api/results/{result_id}")
+def get_results(result_id: str, cursor: str | None = None, page_size: int = settings.RESULT_PAGE_SIZE):
+    try:
+        page = fetch_page(result_id,cursor=cursor,page_size=min(page_size,settings.RESULT_PAGE_SIZE),fetch_size=settings.SQL_FETCH_SIZE)
+    except KeyError:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content=({"error":"Result not found or expired"})
+        )
+    except QueryRejected as e:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content=({"error":str(e)})
+        )
     return JSONResponse(
         status_code=status.HTTP_200_OK,
-        content=({"message": result})
+        content=jsonable_encoder(page)
     )
 
-app.mount("/assets",StaticFiles(directory="frontend/build/client/assets"))
+class BatchQuery(BaseModel):
+    queries: List[Annotated[str,Field(min_length=3,max_length=500)]] = Field(...,min_length=1,max_length=200)
+    table_name: str = Field(...)
+    detailed: bool = Field(False)
+
+@app.post("/api/analyse/batch")
+def answer_batch(payload: BatchQuery):
+    logger.info("%d questions for %s",len(payload.queries),payload.table_name)
+    from ai import batch_orchestrator
+    result = batch_orchestrator(
+        table_name=payload.table_name,
+        user_queries=payload.queries,
+        db=get_db_session(),
+        max_concurrency=settings.BATCH_MAX_CONCURRENCY,
+        detailed=payload.detailed
+    )
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content=({"results": result})
+    )
+
+# ******************************************************
+# Health / startup report
+# ******************************************************
+@app.get("/api/health")
+def health():
+    return {"status":"ok","ai_ready":ai_ready(),"import_seconds":import_report()}
+
+# ******************************************************
+# Prometheus metrics
+# ******************************************************
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body,media_type=content_type)
+
+# hashed bundles are cached for a year, precompressed variants picked by Accept-Encoding
+app.mount("/assets",PrecompressedStaticFiles(directory="frontend/build/client/assets"))
+index_page = IndexPage(os.path.join("frontend", "build", "client", "index.html"))
+
 @app.get("/{full_path:path}")
-async def catch_all(full_path: str):
-  indexFilePath = os.path.join("frontend", "build", "client", "index.html")
-  return FileResponse(path=indexFilePath, media_type="text/html")
\ No newline at end of file
+async def catch_all(
+    full_path: str,
+    accept_encoding: Annotated[str,Header()] = "",
+    if_none_match: Annotated[str | None,Header()] = None
+    ):
+  return index_page.response(accept_encoding=accept_encoding,if_none_match=if_none_match)
\ No newline at end of file
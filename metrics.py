@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+from prometheus_client import Histogram, Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from config import settings
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------
+# Prometheus series
+# -------------------------
+
+STAGE_SECONDS = Histogram(
+    "capstone_stage_seconds",
+    "Time spent per pipeline stage",
+    ["stage"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+STAGE_ERRORS = Counter("capstone_stage_errors_total", "Failed pipeline stages", ["stage"])
+LLM_TOKENS = Counter("capstone_llm_tokens_total", "LLM tokens per stage", ["stage", "kind"])
+ROWS = Counter("capstone_rows_total", "Rows handled per stage", ["stage", "kind"])
+CACHE = Counter("capstone_cache_total", "Cache lookups", ["cache", "result"])
+IMPORT_SECONDS = Gauge("capstone_import_seconds", "Import time of heavy modules", ["module"])
+
+# -------------------------
+# Optional OpenTelemetry spans
+# -------------------------
+
+_tracer = None
+if settings.OTEL_ENABLED:
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("capstone")
+    except ImportError:
+        logger.warning("OTEL_ENABLED is set but opentelemetry is not installed, spans are disabled")
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Time a pipeline stage into capstone_stage_seconds and, when enabled, an OpenTelemetry span.
+    """
+    span_cm = _tracer.start_as_current_span(name, attributes=attributes) if _tracer else None
+    span = span_cm.__enter__() if span_cm else None
+    start = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        STAGE_ERRORS.labels(stage=name).inc()
+        if span_cm:
+            span_cm.__exit__(type(e), e, e.__traceback__)
+            span_cm = None
+        raise
+    finally:
+        STAGE_SECONDS.labels(stage=name).observe(time.perf_counter() - start)
+        if span_cm:
+            span_cm.__exit__(None, None, None)
+
+def record_tokens(stage_name: str, usage: Optional[Dict[str, Any]]):
+    # usage follows langchain's usage_metadata shape
+    if not usage:
+        return
+    LLM_TOKENS.labels(stage=stage_name, kind="input").inc(usage.get("input_tokens", 0) or 0)
+    LLM_TOKENS.labels(stage=stage_name, kind="output").inc(usage.get("output_tokens", 0) or 0)
+    cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    LLM_TOKENS.labels(stage=stage_name, kind="cached").inc(cached)
+    LLM_TOKENS.labels(stage=stage_name, kind="uncached").inc(max((usage.get("input_tokens", 0) or 0) - cached, 0))
+
+def record_rows(stage_name: str, kind: str, count: int):
+    ROWS.labels(stage=stage_name, kind=kind).inc(count)
+
+def record_cache(cache: str, hit: bool, count: int = 1):
+    CACHE.labels(cache=cache, result="hit" if hit else "miss").inc(count)
+
+def render_metrics():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,28 @@
+"""Index metadata_table on created_at, id
+
+Revision ID: 5c2e7a9d4b13
+Revises: 97551a75084b
+Create Date: 2026-10-19 10:12:41.532907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e7a9d4b13'
+down_revision: Union[str, Sequence[str], None] = '97551a75084b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_metadata_table_created_at_id', 'metadata_table', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_metadata_table_created_at_id', table_name='metadata_table')
@@ -0,0 +1,30 @@
+"""Adding content_hash to metadata_table
+
+Revision ID: c4d81b2f6a95
+Revises: a81f3c6e2d07
+Create Date: 2026-10-19 11:31:47.418236
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d81b2f6a95'
+down_revision: Union[str, Sequence[str], None] = 'a81f3c6e2d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('metadata_table', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_metadata_table_content_hash', 'metadata_table', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_metadata_table_content_hash', table_name='metadata_table')
+    op.drop_column('metadata_table', 'content_hash')
@@ -1,4 +1,4 @@
-from sqlalchemy import Column,Integer,String,DateTime
+from sqlalchemy import Column,Integer,String,DateTime,Index,Text
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.dialects.postgresql import UUID,JSONB
 from sqlalchemy.sql import func
@@ -13,4 +13,33 @@ class DatabaseMetadata(Base):
     file_name = Column(String,nullable=False)
     table_name = Column(String,nullable=False,unique=True)
     table_metadata =Column(JSONB,nullable=False,default=dict)
-    created_at = Column(DateTime(timezone=True),default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True),default=func.now())
+    # sha256 of the uploaded bytes + encoding + header, cleared once a batch is appended
+    content_hash = Column(String(64),nullable=True)
+
+    # keyset paging of /api/getfiles, newest first
+    __table_args__ = (
+        Index("ix_metadata_table_created_at_id","created_at","id"),
+        Index("ix_metadata_table_content_hash","content_hash"),
+    )
+
+class IngestJob(Base):
+    __tablename__ = "ingest_jobs"
+
+    id = Column(UUID(as_uuid=True),primary_key=True,default=uuid.uuid4)
+    kind = Column(String,nullable=False)
+    payload = Column(JSONB,nullable=False,default=dict)
+    status = Column(String,nullable=False,default="queued")
+    attempts = Column(Integer,nullable=False,default=0)
+    max_attempts = Column(Integer,nullable=False,default=3)
+    run_after = Column(DateTime(timezone=True),nullable=False,default=func.now())
+    locked_by = Column(String,nullable=True)
+    locked_at = Column(DateTime(timezone=True),nullable=True)
+    last_error = Column(Text,nullable=True)
+    created_at = Column(DateTime(timezone=True),default=func.now())
+    finished_at = Column(DateTime(timezone=True),nullable=True)
+
+    # workers claim queued jobs whose run_after has passed
+    __table_args__ = (
+        Index("ix_ingest_jobs_status_run_after","status","run_after"),
+    )
@@ -0,0 +1,57 @@
+"""
+Write .gz (and .br, when the brotli package is installed) next to every
+compressible file of the frontend build, so the app never compresses per request.
+
+    python precompress.py frontend/build/client
+"""
+import argparse
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (".js", ".mjs", ".css", ".html", ".json", ".svg", ".txt", ".map", ".xml", ".ico", ".webmanifest")
+MIN_SIZE = 1024
+
+def _write_variant(path: str, data: bytes, size: int) -> Optional[int]:
+    # a variant that does not save at least 10% is not worth a disk lookup
+    if len(data) >= size * 0.9:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+def precompress(directory: str) -> int:
+    count = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE):
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                raw = f.read()
+            if len(raw) < MIN_SIZE:
+                continue
+            # mtime=0 keeps the output byte-identical between builds
+            if _write_variant(path + ".gz", gzip.compress(raw, 9, mtime=0), len(raw)):
+                count += 1
+            if brotli is not None and _write_variant(path + ".br", brotli.compress(raw, quality=11), len(raw)):
+                count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompress the frontend build")
+    parser.add_argument("directory", nargs="?", default=os.path.join("frontend", "build", "client"))
+    args = parser.parse_args()
+    count = precompress(args.directory)
+    print(f"Wrote {count} compressed files{'' if brotli else ' (gzip only, brotli is not installed)'}")
+
+
+if __name__ == "__main__":
+    main()
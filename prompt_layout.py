@@ -0,0 +1,55 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any
+
+# -------------------------
+# Prompt pieces ordered most-static -> least-static so provider prefix caching applies:
+# system rules (never change) / dataset catalog (changes per metadata version) / question
+# -------------------------
+
+SUPPORTED_ROLES = ["region", "item_type", "channel", "date", "units_sold", "revenue", "avg_selling_price"]
+DEFAULT_METRICS = ["revenue", "units_sold", "avg_selling_price"]
+
+_MAX_PREFIXES = 256
+_prefixes: "OrderedDict[str, str]" = OrderedDict()
+_lock = threading.Lock()
+
+def _canonical(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+def metadata_version(table_metadata: Dict[str, Any]) -> str:
+    return hashlib.sha256(_canonical(table_metadata).encode("utf-8")).hexdigest()[:16]
+
+def dataset_prefix(table_metadata: Dict[str, Any]) -> str:
+    """
+    Byte-identical planner catalog block for one metadata version.
+    """
+    version = metadata_version(table_metadata)
+    with _lock:
+        prefix = _prefixes.get(version)
+        if prefix is not None:
+            _prefixes.move_to_end(version)
+            return prefix
+
+    distinct_values = table_metadata["distinct_values"]
+    prefix = "-- Dataset --\n" + json.dumps({
+        "supported_roles": SUPPORTED_ROLES,
+        "column_mapping": table_metadata["column_mapping"],
+        "column_catalog": table_metadata["columns"],
+        "allowed_values": {
+            "regions": distinct_values["regions"],
+            "item_types": distinct_values["item_types"],
+            "channels": distinct_values["channels"]
+        },
+        "defaults": {
+            "metrics_if_unspecified": DEFAULT_METRICS
+        }
+    }, sort_keys=True, ensure_ascii=False, indent=1, default=str)
+
+    with _lock:
+        _prefixes[version] = prefix
+        while len(_prefixes) > _MAX_PREFIXES:
+            _prefixes.popitem(last=False)
+    return prefix
@@ -0,0 +1,80 @@
+import threading
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+from db import get_db_session
+from admission import gate
+
+# -------------------------
+# Registry of executed queries, so their full result can be paged later
+# -------------------------
+
+_MAX_RESULTS = 1000
+_results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock = threading.Lock()
+
+def register_result(table_name: str, sql_query: str, key_columns: List[str]) -> str:
+    result_id = uuid.uuid4().hex
+    with _lock:
+        _results[result_id] = {"table_name": table_name, "sql_query": sql_query, "key_columns": key_columns}
+        while len(_results) > _MAX_RESULTS:
+            _results.popitem(last=False)
+    return result_id
+
+def get_result(result_id: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        return _results.get(result_id)
+
+def fetch_page(result_id: str, cursor: Optional[str] = None, page_size: int = 500, fetch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Keyset page over a registered query. Rows are keyed by the text form of their
+    group-by values, which is unique for an aggregate result and orders NULLs too.
+    """
+    entry = get_result(result_id)
+    if entry is None:
+        raise KeyError(result_id)
+
+    key_columns = entry["key_columns"]
+    key_sql = "ROW(" + ", ".join(f'r."{c}"' for c in key_columns) + ")::text" if key_columns else "''"
+    inner = entry["sql_query"].strip().rstrip(";")
+    where_sql = "WHERE __key > :after" if cursor is not None else ""
+    query = f"""SELECT * FROM (SELECT r.*, {key_sql} AS __key FROM ({inner}) AS r) AS k
+        {where_sql}
+        ORDER BY __key
+        LIMIT :page_size"""
+
+    db = get_db_session()
+    try:
+        rows = gate.run(db, query, {"after": cursor, "page_size": page_size + 1}, fetch_size=fetch_size)
+    finally:
+        db.close()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = rows[-1]["__key"] if has_more and rows else None
+    for row in rows:
+        row.pop("__key", None)
+    return {"rows": rows, "next_cursor": next_cursor}
+
+
+# -------------------------
+# Bounded view of a result for the summarizer
+# -------------------------
+
+def summarize_rows(rows: List[Dict[str, Any]], truncated: bool = False) -> Dict[str, Any]:
+    summary: Dict[str, Any] = {"row_count": len(rows), "truncated": truncated, "columns": {}}
+    if not rows:
+        return summary
+    for col in rows[0].keys():
+        values = [r[col] for r in rows if isinstance(r.get(col), (int, float, Decimal)) and not isinstance(r.get(col), bool)]
+        if not values:
+            continue
+        total = sum(float(v) for v in values)
+        summary["columns"][col] = {
+            "min": float(min(values)),
+            "max": float(max(values)),
+            "sum": total,
+            "avg": total / len(values)
+        }
+    return summary
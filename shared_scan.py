@@ -0,0 +1,210 @@
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from db import get_db_session
+from admission import gate, QueryRejected
+from config import settings
+from metrics import record_cache
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------
+# Merge several aggregate plans on one table into a single scan
+# -------------------------
+
+def _predicate(parts: Dict[str, Any]) -> str:
+    return " AND ".join(f"({p})" for p in parts["where"]) or "TRUE"
+
+#SQL for an aggregate of the plan, COUNT_DISTINCT is not a Postgres function
+def aggregate_sql(func: str, expr: str) -> str:
+    if func == "COUNT_DISTINCT":
+        return f"COUNT(DISTINCT {expr})"
+    return f"{func}({expr})"
+
+def _metric_keys(parts: Dict[str, Any]) -> List[str]:
+    # same output names Postgres gives an unaliased aggregate
+    return ["count" if func == "COUNT_DISTINCT" else func.lower() for func, _ in parts["metrics"]]
+
+def is_batchable(parts: Dict[str, Any]) -> bool:
+    """
+    Only aggregate plans whose ORDER BY can be replayed on the demultiplexed rows.
+    """
+    if not parts["metrics"]:
+        return False
+    group_cols = {column for column, _ in parts["group_by"]}
+    metrics = set(parts["metrics"])
+    for func, column, _ in parts["order_by"]:
+        if func is None and column not in group_cols:
+            return False
+        if func is not None and (func, column) not in metrics:
+            return False
+    return True
+
+def build_shared_sql(table_name: str, specs: List[Dict[str, Any]]) -> Tuple[str, List[str]]:
+    """
+    One GROUPING SETS query for all specs. Every spec gets its own
+    FILTER (WHERE ...) aggregates and a match counter q<i>_n.
+    """
+    group_select: Dict[str, str] = {}
+    for parts in specs:
+        for column, select_value in parts["group_by"]:
+            group_select.setdefault(column, select_value)
+    group_cols = list(group_select.keys())
+
+    select_parts = list(group_select.values())
+    if group_cols:
+        select_parts.append(f"GROUPING({', '.join(group_cols)}) AS __grouping")
+    for i, parts in enumerate(specs):
+        pred = _predicate(parts)
+        select_parts.append(f"COUNT(*) FILTER (WHERE {pred}) AS q{i}_n")
+        for j, (func, expr) in enumerate(parts["metrics"]):
+            select_parts.append(f"{aggregate_sql(func, expr)} FILTER (WHERE {pred}) AS q{i}_m{j}")
+
+    preds = [_predicate(parts) for parts in specs]
+    where_sql = "" if "TRUE" in preds else " WHERE " + " OR ".join(f"({p})" for p in preds)
+
+    group_sql = ""
+    if group_cols:
+        sets = []
+        for parts in specs:
+            s = "(" + ", ".join(column for column, _ in parts["group_by"]) + ")"
+            if s not in sets:
+                sets.append(s)
+        group_sql = f" GROUP BY GROUPING SETS ({', '.join(sets)})"
+
+    return f"SELECT {', '.join(select_parts)} FROM {table_name}{where_sql}{group_sql}", group_cols
+
+def _grouping_mask(parts: Dict[str, Any], group_cols: List[str]) -> int:
+    # GROUPING() sets the bit of every column that is NOT in the current set, first argument is the highest bit
+    own = {column for column, _ in parts["group_by"]}
+    k = len(group_cols)
+    return sum(1 << (k - 1 - idx) for idx, column in enumerate(group_cols) if column not in own)
+
+def _order_and_limit(rows: List[Dict[str, Any]], parts: Dict[str, Any]) -> List[Dict[str, Any]]:
+    keys = dict(zip(parts["metrics"], _metric_keys(parts)))
+    for func, column, direction in reversed(parts["order_by"]):
+        key = column if func is None else keys[(func, column)]
+        # Postgres puts NULLs last for ASC and first for DESC
+        rows.sort(key=lambda r: (r[key] is None, r[key]), reverse=(direction == "DESC"))
+    if parts["limit"]:
+        rows = rows[:parts["limit"]]
+    return rows
+
+def demultiplex(rows: List[Dict[str, Any]], specs: List[Dict[str, Any]], group_cols: List[str]) -> List[List[Dict[str, Any]]]:
+    results = []
+    for i, parts in enumerate(specs):
+        mask = _grouping_mask(parts, group_cols)
+        names = _metric_keys(parts)
+        out = []
+        for row in rows:
+            if group_cols and row["__grouping"] != mask:
+                continue
+            # a grouped spec only owns the groups its own filter matched
+            if parts["group_by"] and not row[f"q{i}_n"]:
+                continue
+            item = {column: row[column] for column, _ in parts["group_by"]}
+            for j, name in enumerate(names):
+                item[name] = row[f"q{i}_m{j}"]
+            out.append(item)
+        results.append(_order_and_limit(out, parts))
+    return results
+
+
+# -------------------------
+# Short-window batcher
+# -------------------------
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.results: Optional[List[Any]] = None
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+class SharedScanBatcher:
+    """
+    Collects aggregate plans per table for a few milliseconds, runs them as one
+    scan and hands every caller its own rows back.
+    """
+    def __init__(self, window_ms: int = 5, max_batch: int = 32):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.lock = threading.Lock()
+        self.pending: Dict[str, _Batch] = {}
+
+    def submit(self, table_name: str, parts: Dict[str, Any], sql_query: str, max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+        if self.window <= 0 or not is_batchable(parts):
+            return self._run_one(sql_query, max_rows)
+
+        with self.lock:
+            batch = self.pending.get(table_name)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self.pending[table_name] = batch
+            idx = len(batch.items)
+            batch.items.append((parts, sql_query, max_rows))
+            if len(batch.items) >= self.max_batch:
+                del self.pending[table_name]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self.lock:
+                if self.pending.get(table_name) is batch:
+                    del self.pending[table_name]
+            try:
+                batch.results = self._run_batch(table_name, batch.items)
+            except Exception as e:
+                batch.results = [e] * len(batch.items)
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        result = batch.results[idx]
+        if isinstance(result, Exception):
+            raise result
+        return result[:max_rows] if max_rows is not None else result
+
+    def _run_one(self, sql_query: str, max_rows: Optional[int] = None) -> List[Dict[str, Any]]:
+        db = get_db_session()
+        try:
+            return gate.run(db, sql_query, fetch_size=settings.SQL_FETCH_SIZE, max_rows=max_rows)
+        finally:
+            db.close()
+
+    def _run_batch(self, table_name: str, items) -> List[Any]:
+        if len(items) == 1:
+            record_cache("shared_scan", hit=False)
+            return [self._run_one(items[0][1], items[0][2])]
+
+        specs = [parts for parts, _, _ in items]
+        sql_query, group_cols = build_shared_sql(table_name, specs)
+        logger.debug("Shared scan : %d queries on %s", len(specs), table_name)
+        record_cache("shared_scan", hit=True, count=len(specs) - 1)
+        try:
+            rows = self._run_one(sql_query)
+            return demultiplex(rows, specs, group_cols)
+        except QueryRejected as e:
+            if e.reason != "cost":
+                # busy or cancelled by the timeout: N more scans would only add load, every caller gets it
+                return [e] * len(items)
+            # over budget as one query, the single ones may each fit
+            logger.info("Shared scan over budget, running queries one by one")
+            return self._run_each(items)
+        except Exception as e:
+            logger.warning("Shared scan failed, running queries one by one : %s", e)
+            return self._run_each(items)
+
+    def _run_each(self, items) -> List[Any]:
+        # one scan per query, errors stay with their own caller
+        results = []
+        for _, single_sql, max_rows in items:
+            try:
+                results.append(self._run_one(single_sql, max_rows))
+            except Exception as err:
+                results.append(err)
+        return results
+
+batcher = SharedScanBatcher(window_ms=settings.SHARED_SCAN_WINDOW_MS, max_batch=settings.SHARED_SCAN_MAX_BATCH)
@@ -44,25 +44,26 @@ def build_analytics_sql(
         group_parts.append(f'"{c}"')
 
     # metrics in SELECT
-    # Note: columns stored as TEXT in MVP; cast to numeric safely.
+    # Note: metric columns are stored with their narrowed numeric type, no casts needed.
     if "revenue" in metrics:
         rev_col = _col(mapping, "revenue")
-        select_parts.append(f'SUM(("{rev_col}")::numeric) AS revenue')
+        select_parts.append(f'SUM("{rev_col}") AS revenue')
     if "units_sold" in metrics:
         u_col = _col(mapping, "units_sold")
-        select_parts.append(f'SUM(("{u_col}")::numeric) AS units_sold')
+        select_parts.append(f'SUM("{u_col}") AS units_sold')
     if "avg_selling_price" in metrics:
         # if price column exists, use AVG(price)
         # else compute revenue/units if both available
         p_col = mapping.get("avg_selling_price")
         if p_col:
-            select_parts.append(f'AVG(("{p_col}")::numeric) AS avg_selling_price')
+            select_parts.append(f'AVG("{p_col}") AS avg_selling_price')
         else:
             # derived avg = revenue/units requires both
             rev_col = _col(mapping, "revenue")
             u_col = _col(mapping, "units_sold")
             select_parts.append(
-                f'(SUM(("{rev_col}")::numeric) / NULLIF(SUM(("{u_col}")::numeric), 0)) AS avg_selling_price'
+                # integer sums would divide as integers
+                f'(SUM("{rev_col}")::double precision / NULLIF(SUM("{u_col}"), 0)) AS avg_selling_price'
             )
 
     if not select_parts:
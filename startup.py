@@ -0,0 +1,47 @@
+import importlib
+import threading
+import time
+from typing import Dict, Iterable
+from metrics import IMPORT_SECONDS
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# modules the API process needs for upload / analyse, loaded off the request path
+HEAVY_MODULES = ("numpy", "pandas", "charset_normalizer", "dataset_store", "infer_metadata", "ai")
+
+_import_seconds: Dict[str, float] = {}
+_ai_ready = threading.Event()
+
+def timed_import(name: str):
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    if name not in _import_seconds:
+        _import_seconds[name] = time.perf_counter() - start
+        IMPORT_SECONDS.labels(module=name).set(_import_seconds[name])
+    return module
+
+def warm_up(modules: Iterable[str] = HEAVY_MODULES):
+    """
+    Import the heavy stack and build the LLM client in the background,
+    so light endpoints serve traffic while this runs.
+    """
+    start = time.perf_counter()
+    try:
+        for name in modules:
+            timed_import(name)
+        ai = timed_import("ai")
+        ai.get_llm()
+        _ai_ready.set()
+        logger.info("Warm-up done in %.2fs : %s", time.perf_counter() - start, import_report())
+    except Exception:
+        logger.exception("Warm-up failed, modules will load on first use")
+
+def start_warm_up():
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def ai_ready() -> bool:
+    return _ai_ready.is_set()
+
+def import_report() -> Dict[str, float]:
+    return {name: round(seconds, 4) for name, seconds in _import_seconds.items()}
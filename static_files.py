@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# -------------------------
+# Frontend serving: precompressed variants (precompress.py writes them at build time),
+# long-lived caching for content-hashed assets, index.html kept in memory with an ETag
+# -------------------------
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# the variants looked for next to a file, in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+# vite output names carry an 8 character content hash: root-BxY1z2ab.js, index-D4f_9kQe.css.
+# A hash has a digit or an uppercase letter, so app-settings.js is not taken for one
+HASHED_NAME = re.compile(r"[-.](?=[A-Za-z0-9_-]{0,7}[0-9A-Z])[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+
+def accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        name, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name)
+    return accepted
+
+def negotiate(full_path: str, accept_encoding: str) -> Tuple[Optional[str], str]:
+    """
+    (content-encoding, path to serve), the smallest variant on disk the client accepts.
+    """
+    accepted = accepted_encodings(accept_encoding)
+    for encoding, ext in ENCODINGS:
+        if (encoding in accepted or "*" in accepted) and os.path.isfile(full_path + ext):
+            return encoding, full_path + ext
+    return None, full_path
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        full_path = str(full_path)
+        encoding, path = negotiate(full_path, request_headers.get("accept-encoding", ""))
+        if path != full_path:
+            stat_result = os.stat(path)
+        # media type of the original file, not of the .br / .gz
+        media_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE if HASHED_NAME.search(full_path) else REVALIDATE
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+class IndexPage:
+    """
+    The SPA shell served for every client-side route. Read and compressed once,
+    reloaded only when the file on disk changes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        # (etag, bodies by content-encoding), swapped as one so readers never mix versions
+        self._state: Tuple[str, Dict[Optional[str], bytes]] = ("", {})
+
+    def _load(self) -> Tuple[str, Dict[Optional[str], bytes]]:
+        mtime = os.stat(self.path).st_mtime
+        if mtime == self._mtime:
+            return self._state
+        with self._lock:
+            if mtime == self._mtime:
+                return self._state
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            bodies: Dict[Optional[str], bytes] = {None: raw, "gzip": gzip.compress(raw, 9, mtime=0)}
+            if brotli is not None:
+                bodies["br"] = brotli.compress(raw, quality=11)
+            self._state = ('"' + hashlib.sha1(raw).hexdigest() + '"', bodies)
+            self._mtime = mtime
+            return self._state
+
+    def response(self, accept_encoding: str = "", if_none_match: Optional[str] = None) -> Response:
+        etag, bodies = self._load()
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE, "Vary": "Accept-Encoding"}
+        # weak comparison, W/"..." from a proxy or the browser matches too
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]):
+            return Response(status_code=304, headers=headers)
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in bodies and (encoding in accepted or "*" in accepted):
+                headers["Content-Encoding"] = encoding
+                return Response(content=bodies[encoding], media_type="text/html", headers=headers)
+        return Response(content=bodies[None], media_type="text/html", headers=headers)
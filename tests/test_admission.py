@@ -0,0 +1,15 @@
+from admission import QueryGate
+
+def make_gate():
+    return QueryGate(fast_concurrency=2, slow_concurrency=1, fast_cost=100, fast_rows=1000, max_cost=10000,
+                     fast_timeout_ms=1000, slow_timeout_ms=5000, queue_timeout=1)
+
+def test_classify():
+    gate = make_gate()
+    assert gate.classify({"cost": 10, "rows": 10}) == "fast"
+    assert gate.classify({"cost": 500, "rows": 10}) == "slow"
+    assert gate.classify({"cost": 10, "rows": 5000}) == "slow"
+    assert gate.classify({"cost": 20000, "rows": 1}) == "rejected"
+    # the budget is inclusive
+    assert gate.classify({"cost": 10000, "rows": 1}) == "slow"
+    assert gate.classify({"cost": 100, "rows": 1000}) == "fast"
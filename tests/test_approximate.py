@@ -0,0 +1,51 @@
+import math
+import pytest
+from approximate import build_sample_sql, is_approximable, sample_percent, scale_sample_rows
+
+PARTS = {
+    "metrics": [("SUM", "revenue"), ("COUNT", "order_id"), ("AVG", "price")],
+    "where": ["region = 1"],
+    "group_by": [("channel", "channel")],
+    "order_by": [("SUM", "revenue", "DESC")],
+    "limit": 5,
+}
+
+def test_sample_percent():
+    assert sample_percent(10_000_000, 200_000, 1_000_000) == 2.0
+    # too small to sample, or the sample would be most of the table
+    assert sample_percent(500_000, 200_000, 1_000_000) is None
+    assert sample_percent(1_000_000, 600_000, 1_000_000) is None
+    assert sample_percent(0, 200_000, 1_000_000) is None
+    assert sample_percent(10_000_000_000, 200_000, 1_000_000) == 0.01
+
+def test_is_approximable():
+    assert is_approximable(PARTS)
+    assert not is_approximable({**PARTS, "metrics": [("COUNT_DISTINCT", "item_type")]})
+    assert not is_approximable({**PARTS, "metrics": []})
+
+def test_build_sample_sql():
+    sql = build_sample_sql("sales", PARTS, 2.0, "SYSTEM")
+    assert "FROM sales TABLESAMPLE SYSTEM (2.0) WHERE 1=1 AND region = 1" in sql
+    assert "SUM(revenue) AS m0" in sql and "m0_ss" in sql and "m2_sd" in sql and "m2_n" in sql
+    assert sql.endswith("GROUP BY channel ORDER BY SUM(revenue) DESC LIMIT 5")
+    with pytest.raises(ValueError):
+        build_sample_sql("sales", PARTS, 2.0, "RANDOM")
+
+def test_scale_sample_rows():
+    row = {"channel": "Online", "m0": 50.0, "m0_ss": 1000.0, "m1": 40, "m2": 12.5, "m2_sd": 4.0, "m2_n": 100}
+    [item] = scale_sample_rows([row], PARTS, 10.0, confidence=0.95)
+    assert item["channel"] == "Online"
+    # Horvitz-Thompson: divide by the sampled fraction, finite population correction on the variance
+    assert item["sum"] == pytest.approx(500.0)
+    assert item["sum_margin"] == pytest.approx(1.96 * math.sqrt(0.9 * 1000.0) / 0.1)
+    assert item["count"] == 400.0
+    assert item["count_margin"] == pytest.approx(1.96 * math.sqrt(0.9 * 40) / 0.1)
+    assert item["avg"] == 12.5
+    assert item["avg_margin"] == pytest.approx(1.96 * 4.0 / 10 * math.sqrt(0.9))
+
+def test_scale_sample_rows_without_enough_data():
+    row = {"channel": "Online", "m0": None, "m1": 3, "m2": 7.0, "m2_sd": None, "m2_n": 1}
+    [item] = scale_sample_rows([row], PARTS, 50.0, confidence=0.9)
+    assert item["sum"] is None and item["sum_margin"] is None
+    assert item["count"] == 6.0 and item["count_margin"] == pytest.approx(1.645 * math.sqrt(0.5 * 3) / 0.5)
+    assert item["avg"] == 7.0 and item["avg_margin"] is None
@@ -0,0 +1,23 @@
+import pandas as pd
+from dataset_store import _copy_null_token, upload_fingerprint, widen_storage
+
+def test_copy_null_token_defaults_to_backslash_n():
+    df = pd.DataFrame({"name": ["a", None], "qty": [1.0, None]})
+    assert _copy_null_token(df) == "\\N"
+
+def test_copy_null_token_avoids_a_literal_backslash_n():
+    for values in (pd.Series(["\\N", None]), pd.Series(["\\N", "b"], dtype="category")):
+        df = pd.DataFrame({"name": values})
+        token = _copy_null_token(df)
+        assert token != "\\N"
+        assert not df["name"].astype(object).eq(token).any()
+
+def test_upload_fingerprint_covers_load_options():
+    plain = upload_fingerprint("ab", "utf-8", ["x"], {"dictionary_encode": False})
+    assert plain == upload_fingerprint("ab", "utf-8", ["x"], {"dictionary_encode": False})
+    assert plain != upload_fingerprint("ab", "utf-8", ["x"], {"dictionary_encode": True})
+
+def test_widen_storage():
+    assert widen_storage("smallint", "integer") == "integer"
+    assert widen_storage("numeric(18,2)", None) == "numeric(18,2)"
+    assert widen_storage("bigint", "double precision") == "numeric"
@@ -0,0 +1,15 @@
+import pandas as pd
+from infer_metadata import coerce_numeric, infer_numeric_storage, unparsed_count
+
+def test_numeric_storage():
+    assert infer_numeric_storage(pd.Series(["1", "2", None])) == "smallint"
+    assert infer_numeric_storage(pd.Series(["$1,234.50", "3.1"])) == "numeric(18,2)"
+    # scientific notation has more decimals than money keeps
+    assert infer_numeric_storage(pd.Series(["1e-05", "2"])) == "double precision"
+    assert infer_numeric_storage(pd.Series([None, None], dtype=object)) is None
+
+def test_unparsed_cells_are_counted():
+    series = pd.Series(["10", "n/a-ish", None, "$3"], dtype=object)
+    coerced = coerce_numeric(series, "smallint")
+    assert coerced.tolist()[0] == 10 and coerced.tolist()[3] == 3
+    assert unparsed_count(series, coerced) == 1
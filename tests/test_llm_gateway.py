@@ -0,0 +1,39 @@
+import threading
+import pytest
+from llm_gateway import LLMGateway
+
+class Chain:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def invoke(self, inputs, config=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, threading.Event):
+            outcome.wait(5)
+            return "late"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def gateway(timeout=1.0):
+    return LLMGateway(max_concurrency=2, timeouts={"stage": timeout}, max_retries=2, retry_budget=30)
+
+def test_transient_failure_is_retried():
+    chain = Chain([TimeoutError("upstream"), "ok"])
+    assert gateway().invoke("stage", chain, {"q": 1}) == "ok"
+    assert chain.calls == 2
+
+def test_other_failures_are_not_retried():
+    chain = Chain([ValueError("could not parse"), "ok"])
+    with pytest.raises(ValueError):
+        gateway().invoke("stage", chain, {"q": 2})
+    assert chain.calls == 1
+
+def test_timed_out_call_is_awaited_not_repeated():
+    release = threading.Event()
+    chain = Chain([release, "second call"])
+    threading.Timer(0.15, release.set).start()
+    assert gateway(timeout=0.1).invoke("stage", chain, {"q": 3}) == "late"
+    assert chain.calls == 1
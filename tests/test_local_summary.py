@@ -0,0 +1,25 @@
+from local_summary import render_summary, summarize_locally
+
+ANSWER = {
+    "filters": {"region": None, "item_type": None, "channel": None, "date": None},
+    "extra_filter": [],
+    "metrics": [{"SUM": "revenue"}, {"AVG": "unit_price"}],
+    "group_by": ["region"],
+    "order_by": [],
+    "limit": 0,
+    "notes": [],
+}
+
+def test_metric_without_values_in_any_group():
+    rows = [{"region": region, "sum": 100.0 * (i + 1), "avg": None} for i, region in enumerate(["Asia", "Europe", "Africa", "Oceania"])]
+    text = render_summary(ANSWER, rows, ["region"])
+    assert "Total revenue ranges from 100 (Asia) to 400 (Oceania)." in text
+    assert "Average unit price has no values in these groups." in text
+
+def test_no_values_at_all():
+    rows = [{"region": region, "sum": None, "avg": None} for region in ["Asia", "Europe", "Africa", "Oceania"]]
+    assert render_summary(ANSWER, rows, ["region"]).startswith("No matching data was found")
+
+def test_large_results_go_to_the_llm():
+    rows = [{"region": str(i), "sum": i, "avg": i} for i in range(11)]
+    assert summarize_locally(ANSWER, rows, ["region"]) is None
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+import ai
+from fast_planner import plan_question
+
+TABLE_METADATA = {
+    "column_mapping": {"region": "region", "item_type": "item_type", "revenue": "total_revenue", "date": "order_date"},
+    "columns": [{"name": "region"}, {"name": "item_type"}, {"name": "total_revenue"}, {"name": "order_date"}],
+    "distinct_values": {"regions": ["Europe", "Asia"], "item_types": ["Cereal", "Snacks"]},
+}
+
+def compile_question(question):
+    plan, confidence = plan_question(question, TABLE_METADATA)
+    assert plan is not None and confidence == 1.0
+    answer = ai.ResultData.model_validate({"answer": plan}).model_dump()
+    return ai.sql_builder(db_result=TABLE_METADATA, table_name="sales", data=answer["answer"])
+
+def test_count_distinct_compiles_to_postgres_syntax():
+    sql = compile_question("how many products per region")
+    assert "COUNT(DISTINCT item_type)" in sql
+    assert "COUNT_DISTINCT(" not in sql
+    assert "group by region" in sql
+
+def test_top_n_orders_by_the_aggregate():
+    sql = compile_question("top 3 regions by revenue")
+    assert "SUM(total_revenue)" in sql
+    assert "order by SUM(total_revenue) DESC" in sql
+    assert "limit 3" in sql
@@ -0,0 +1,30 @@
+import pytest
+from admission import QueryRejected
+from shared_scan import SharedScanBatcher
+
+PARTS = {"metrics": [("SUM", "revenue")], "where": [], "group_by": [], "order_by": [], "limit": None}
+ITEMS = [(PARTS, "select 1", None), ({**PARTS, "where": ["region = 1"]}, "select 2", None)]
+
+def batcher_failing_with(error):
+    batcher = SharedScanBatcher(window_ms=5)
+    calls = []
+
+    def run_one(sql_query, max_rows=None):
+        calls.append(sql_query)
+        if sql_query.startswith("SELECT"):
+            raise error
+        return [{"sum": 1}]
+    batcher._run_one = run_one
+    return batcher, calls
+
+@pytest.mark.parametrize("reason", ["timeout", "busy"])
+def test_cancelled_shared_scan_is_not_rerun(reason):
+    batcher, calls = batcher_failing_with(QueryRejected("cancelled", reason=reason))
+    results = batcher._run_batch("sales", ITEMS)
+    assert len(calls) == 1
+    assert all(isinstance(r, QueryRejected) and r.reason == reason for r in results)
+
+def test_over_budget_shared_scan_falls_back():
+    batcher, calls = batcher_failing_with(QueryRejected("too expensive"))
+    assert batcher._run_batch("sales", ITEMS) == [[{"sum": 1}], [{"sum": 1}]]
+    assert calls[1:] == ["select 1", "select 2"]
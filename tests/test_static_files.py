@@ -0,0 +1,33 @@
+from static_files import HASHED_NAME, IndexPage, accepted_encodings, negotiate
+
+def test_hashed_names():
+    assert HASHED_NAME.search("/assets/root-BxY1z2ab.js")
+    assert HASHED_NAME.search("/assets/index-D4f_9kQe.css")
+    assert not HASHED_NAME.search("/assets/app-settings.js")
+    assert not HASHED_NAME.search("/favicon.ico")
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br;q=0.5") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip") == {"gzip"}
+    assert accepted_encodings("") == set()
+
+def test_negotiate_prefers_brotli_on_disk(tmp_path):
+    path = tmp_path / "app.js"
+    for name in ("app.js", "app.js.gz", "app.js.br"):
+        (tmp_path / name).write_bytes(b"x")
+    assert negotiate(str(path), "gzip, br") == ("br", str(path) + ".br")
+    assert negotiate(str(path), "gzip") == ("gzip", str(path) + ".gz")
+    assert negotiate(str(path), "identity") == (None, str(path))
+    (tmp_path / "app.js.br").unlink()
+    assert negotiate(str(path), "*") == ("gzip", str(path) + ".gz")
+
+def test_index_page_etag(tmp_path):
+    path = tmp_path / "index.html"
+    path.write_text("<html>" + "x" * 2000 + "</html>")
+    page = IndexPage(str(path))
+    first = page.response(accept_encoding="gzip")
+    assert first.status_code == 200 and first.headers["content-encoding"] == "gzip"
+    etag = first.headers["etag"]
+    assert page.response(if_none_match=etag).status_code == 304
+    assert page.response(if_none_match="W/" + etag).status_code == 304
+    assert page.response(if_none_match='"other"').status_code == 200
@@ -0,0 +1,175 @@
+"""
+Background job worker for dataset profiling.
+
+    python -m worker --processes 4
+
+Jobs come from the ingest_jobs table (job_queue.py) and run in a process pool,
+so profiling never competes with request handling. The web process runs one of
+these in a thread when EMBEDDED_WORKER is set.
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional
+from config import settings
+from job_queue import claim_jobs, complete_job, fail_job, requeue_stale
+from metrics import STAGE_SECONDS, STAGE_ERRORS, record_rows
+from app_logging import get_logger
+
+logger = get_logger(__name__)
+
+# -------------------------
+# Job handlers, run inside the pool processes
+# -------------------------
+
+def _profile_dataset(payload: Dict[str, Any], final_attempt: bool) -> Dict[str, Any]:
+    from db import get_db_session
+    from infer_metadata import infer_and_store_metadata
+    db = get_db_session()
+    try:
+        meta = infer_and_store_metadata(
+            db, payload["dataset_id"], payload["file_name"], payload["table_name"],
+            profile_workers=settings.PROFILE_COLUMN_WORKERS, final_attempt=final_attempt
+        )
+    finally:
+        db.close()
+    return {"rows": (meta.get("stats") or {}).get("row_count", 0)}
+
+JOB_HANDLERS = {
+    "profile_dataset": _profile_dataset,
+}
+# metrics observed inside a pool process stay in that process, so the parent
+# records the stage of every job from what run_job hands back
+JOB_STAGES = {
+    "profile_dataset": "metadata_profiling",
+}
+
+def run_job(kind: str, payload: Dict[str, Any], final_attempt: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    result = JOB_HANDLERS[kind](payload, final_attempt) or {}
+    return {**result, "seconds": time.perf_counter() - start}
+
+def _mark_dataset_failed(payload: Dict[str, Any], error: str):
+    # profiling gave up, do not leave the dataset at "processing" forever
+    from db import get_db_session
+    from model import DatabaseMetadata
+    from dataset_events import publish
+    db = get_db_session()
+    try:
+        row = db.query(DatabaseMetadata).filter(DatabaseMetadata.id == payload["dataset_id"]).first()
+        if row is not None:
+            row.table_metadata = {**(row.table_metadata or {}), "status": "error", "error": error[:500]}
+            db.commit()
+    finally:
+        db.close()
+    # a killed pool process never published its own failure
+    publish(payload["table_name"], "failed", error=error[:500])
+
+
+# -------------------------
+# Claim / dispatch loop
+# -------------------------
+
+class Worker:
+    def __init__(self, processes: int, poll_seconds: float = 1.0, stale_seconds: float = 900):
+        self.processes = processes
+        self.poll_seconds = poll_seconds
+        self.stale_seconds = stale_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent may be a threaded web server holding DB connections
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def run(self, stop: threading.Event):
+        pool = self._new_pool()
+        in_flight = {}
+        last_stale_check = 0.0
+        logger.info("Worker %s started with %d processes", self.worker_id, self.processes)
+        try:
+            while not stop.is_set():
+                try:
+                    if time.monotonic() - last_stale_check > self.stale_seconds / 3:
+                        requeue_stale(self.stale_seconds)
+                        last_stale_check = time.monotonic()
+
+                    free = self.processes - len(in_flight)
+                    for job in (claim_jobs(self.worker_id, free) if free else []):
+                        final_attempt = job["attempts"] >= job["max_attempts"]
+                        future = pool.submit(run_job, job["kind"], job["payload"], final_attempt)
+                        in_flight[future] = (job, time.monotonic())
+                        logger.info("Job %s (%s) started, attempt %d", job["id"], job["kind"], job["attempts"])
+                except Exception:
+                    logger.exception("Failed to claim jobs")
+
+                if not in_flight:
+                    stop.wait(self.poll_seconds)
+                    continue
+                done, _ = wait(list(in_flight), timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    job, started = in_flight.pop(future)
+                    broken = broken or isinstance(future.exception(), BrokenProcessPool)
+                    self._finish(job, future, time.monotonic() - started)
+                if broken and not in_flight:
+                    # a child died (OOM kill etc.), the executor cannot be reused
+                    logger.warning("Process pool broken, starting a new one")
+                    pool.shutdown(wait=False)
+                    pool = self._new_pool()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            logger.info("Worker %s stopped", self.worker_id)
+
+    def _finish(self, job: Dict[str, Any], future, seconds: float):
+        stage_name = JOB_STAGES.get(job["kind"])
+        try:
+            error: Optional[BaseException] = future.exception()
+            if error is None:
+                outcome = future.result()
+                if stage_name:
+                    STAGE_SECONDS.labels(stage=stage_name).observe(outcome["seconds"])
+                    record_rows(stage_name, "profiled", outcome.get("rows", 0))
+                complete_job(job, seconds)
+                logger.info("Job %s done in %.2fs", job["id"], seconds)
+                return
+            if stage_name:
+                STAGE_ERRORS.labels(stage=stage_name).inc()
+                STAGE_SECONDS.labels(stage=stage_name).observe(seconds)
+            retry = fail_job(job, repr(error), seconds)
+            logger.warning("Job %s failed (%s), %s", job["id"], error, "will retry" if retry else "giving up")
+            if not retry and job["kind"] == "profile_dataset":
+                _mark_dataset_failed(job["payload"], repr(error))
+        except Exception:
+            logger.exception("Failed to record the outcome of job %s", job["id"])
+
+def start_embedded_worker(stop: threading.Event) -> threading.Thread:
+    worker = Worker(settings.WORKER_PROCESSES, settings.JOB_POLL_SECONDS, settings.JOB_STALE_SECONDS)
+    thread = threading.Thread(target=worker.run, args=(stop,), name="job-worker", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the dataset profiling worker")
+    parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES)
+    parser.add_argument("--poll-seconds", type=float, default=settings.JOB_POLL_SECONDS)
+    args = parser.parse_args()
+
+    if settings.WORKER_METRICS_PORT:
+        from prometheus_client import start_http_server
+        start_http_server(settings.WORKER_METRICS_PORT)
+
+    stop = threading.Event()
+    try:
+        Worker(args.processes, args.poll_seconds, settings.JOB_STALE_SECONDS).run(stop)
+    except KeyboardInterrupt:
+        stop.set()
+
+
+if __name__ == "__main__":
+    main()